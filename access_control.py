@@ -0,0 +1,65 @@
+"""
+In-memory index of authorized Telegram users, reloaded when the shared store changes
+"""
+
+import logging
+import threading
+import time
+from config import ACL_RECHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+class AuthorizedUsers:
+    def __init__(self, store, recheck_interval: float = None):
+        self.store = store
+        self.recheck_interval = ACL_RECHECK_INTERVAL if recheck_interval is None else recheck_interval
+        self._lock = threading.Lock()
+        self._users = frozenset()
+        self._version = None  # Store ACL version the index was built from
+        self._checked_at = 0.0
+        self.reload()
+    
+    def is_authorized(self, user_id) -> bool:
+        """Check a user against the index; an empty list lets everyone in"""
+        if self.needs_recheck():
+            self.reload_if_changed()
+        users = self._users
+        return not users or str(user_id) in users
+    
+    def needs_recheck(self) -> bool:
+        """Whether the next lookup would query the store for the ACL version"""
+        return time.monotonic() - self._checked_at >= self.recheck_interval
+    
+    def mark_stale(self):
+        """Make the next lookup re-check the store (e.g. after the dashboard signals a change)"""
+        self._checked_at = 0.0
+    
+    def reload(self):
+        """Rebuild the index from the store unconditionally"""
+        with self._lock:
+            self._load()
+    
+    def __len__(self):
+        return len(self._users)
+    
+    def reload_if_changed(self):
+        """Rebuild the index only if the store's ACL version moved"""
+        with self._lock:
+            try:
+                if self.store.acl_version() != self._version:
+                    self._load()
+            except Exception as e:
+                logger.error(f"Error checking authorized users version: {e}")
+            self._checked_at = time.monotonic()
+    
+    def _load(self):
+        try:
+            # Read the version first so a change landing mid-load is picked up next time
+            version = self.store.acl_version()
+            self._users = frozenset(self.store.list_authorized_users())
+            self._version = version
+            logger.info(f"Loaded {len(self._users)} authorized users")
+        except Exception as e:
+            # Keep serving the previous list until the store is readable again
+            logger.error(f"Error loading authorized users: {e}")
+        self._checked_at = time.monotonic()
@@ -0,0 +1,91 @@
+"""
+Conversion throughput per input format on a synthetic corpus
+
+Times FileConverter's extractor for each format and DOCX creation from the extracted
+text, and reports docs/sec, p50/p95 latency and peak RSS as JSON. Each format runs
+in a fresh process so its peak RSS is not inflated by the formats before it.
+
+Usage: python benchmarks/conversion_benchmark.py [--formats txt,pdf] [--sizes small,medium]
+                                                 [--docs 3] [--output run.json] [--compare baseline.json]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import harness
+
+def run_format(file_format: str, documents: list, pdf_workers: int) -> dict:
+    """Convert every document of one format (runs in its own process)"""
+    from file_converter import FileConverter
+    
+    file_converter = FileConverter(pdf_workers=pdf_workers)
+    extension = f'.{file_format}'
+    timings = {}
+    errors = {}
+    for size_name, path in documents:
+        try:
+            started = time.perf_counter()
+            text = file_converter._extract_text(path, extension)
+            extracted_at = time.perf_counter()
+            file_converter._create_docx(text, os.path.basename(path), output=io.BytesIO())
+            finished = time.perf_counter()
+        except Exception as e:
+            errors[size_name] = f'{type(e).__name__}: {e}'
+            continue
+        stages = timings.setdefault(size_name, {'extract': [], 'docx': [], 'total': []})
+        stages['extract'].append(extracted_at - started)
+        stages['docx'].append(finished - extracted_at)
+        stages['total'].append(finished - started)
+    
+    results = {}
+    for size_name, stages in timings.items():
+        result = harness.summarize(stages['total'])
+        result['extract_p50_ms'] = harness.summarize(stages['extract'])['p50_ms']
+        result['docx_p50_ms'] = harness.summarize(stages['docx'])['p50_ms']
+        results[size_name] = result
+    for size_name, error in errors.items():
+        results.setdefault(size_name, {})['error'] = error
+    peak_rss = harness.peak_rss_mb()
+    for result in results.values():
+        result['peak_rss_mb'] = peak_rss
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--formats', default=','.join(corpus.FORMATS))
+    parser.add_argument('--sizes', default=','.join(corpus.SIZES))
+    parser.add_argument('--docs', type=int, default=3, help='documents per format and size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pdf-workers', type=int, default=0, help='FileConverter pdf_workers (0 = serial)')
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'fileconvertor-corpus'))
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--compare', help='baseline JSON report to compare p50 latency against')
+    args = parser.parse_args()
+    
+    formats = [file_format for file_format in args.formats.split(',') if file_format]
+    sizes = {size_name: corpus.SIZES[size_name] for size_name in args.sizes.split(',') if size_name}
+    documents = corpus.build_corpus(args.corpus_dir, formats, sizes, args.docs, args.seed)
+    
+    results = {}
+    for file_format in formats:
+        format_documents = [(size_name, path) for doc_format, size_name, path in documents if doc_format == file_format]
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            format_results = executor.submit(run_format, file_format, format_documents, args.pdf_workers).result()
+        for size_name, result in format_results.items():
+            results[f'{file_format}/{size_name}'] = result
+    
+    settings = {'formats': formats, 'sizes': sizes, 'docs': args.docs, 'seed': args.seed, 'pdf_workers': args.pdf_workers}
+    report = harness.write_report('conversion', settings, results, args.output)
+    if args.compare:
+        harness.compare_reports(args.compare, report)
+
+if __name__ == '__main__':
+    main()
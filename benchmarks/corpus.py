@@ -0,0 +1,140 @@
+"""
+Deterministic synthetic documents for the benchmarks
+
+Every generator takes a word count and a seed and writes one file, so a corpus can
+be rebuilt byte-for-byte on another machine or commit.
+"""
+
+import os
+import random
+import zipfile
+
+from PIL import Image, ImageDraw
+
+from docx_writer import DocxWriter, iter_paragraphs
+
+# ASCII only so the same text survives PDF's standard fonts and RTF unchanged
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua ut enim ad minim veniam quis nostrud exercitation ullamco laboris nisi '
+         'aliquip ex ea commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum').split()
+
+# Word counts for each size class
+SIZES = {'small': 500, 'medium': 5000, 'large': 50000}
+
+# Images are OCR'd, so their classes grow as taller pages (more tiles) at far fewer words
+IMAGE_SIZES = {'small': 500, 'medium': 1500, 'large': 4000}
+
+FORMATS = ('txt', 'pdf', 'docx', 'rtf', 'odt', 'png')
+
+def make_text(words: int, seed: int = 0) -> str:
+    """Return sentences grouped into paragraphs of a few lines, one paragraph per line break"""
+    rng = random.Random(seed)
+    lines = []
+    remaining = words
+    while remaining > 0:
+        count = min(remaining, rng.randint(6, 18))
+        sentence = ' '.join(rng.choices(WORDS, k=count))
+        lines.append(sentence[0].upper() + sentence[1:] + '.')
+        remaining -= count
+    return '\n'.join(lines)
+
+def write_txt(path: str, text: str):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+def write_docx(path: str, text: str):
+    with DocxWriter(path) as writer:
+        writer.add_paragraphs(iter_paragraphs(text))
+
+def write_rtf(path: str, text: str):
+    body = '\\par\n'.join(line.replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}')
+                          for line in text.split('\n'))
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0 Helvetica;}}\\f0\\fs22\n' + body + '\n}')
+
+def write_odt(path: str, text: str):
+    paragraphs = ''.join(
+        f'<text:p>{line.replace("&", "&amp;").replace("<", "&lt;")}</text:p>' for line in text.split('\n')
+    )
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+        'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" office:version="1.2">'
+        f'<office:body><office:text>{paragraphs}</office:text></office:body></office:document-content>'
+    )
+    with zipfile.ZipFile(path, 'w') as odt_file:
+        # The mimetype entry must come first and be stored uncompressed
+        odt_file.writestr('mimetype', 'application/vnd.oasis.opendocument.text', compress_type=zipfile.ZIP_STORED)
+        odt_file.writestr('content.xml', content, compress_type=zipfile.ZIP_DEFLATED)
+
+def write_pdf(path: str, text: str, lines_per_page: int = 50, chars_per_line: int = 90):
+    """Write a text-only PDF using the standard Helvetica font"""
+    lines = []
+    for paragraph in text.split('\n'):
+        while paragraph:
+            cut = paragraph.rfind(' ', 0, chars_per_line) if len(paragraph) > chars_per_line else len(paragraph)
+            cut = cut if cut > 0 else chars_per_line
+            lines.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)] or [[]]
+    
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for page_lines in pages:
+        escaped = (line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for line in page_lines)
+        stream = 'BT /F1 10 Tf 14 TL 56 760 Td ' + ' '.join(f'({line}) \'' for line in escaped) + ' ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        page_ids.append(len(objects))
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(f"{page_id} 0 R" for page_id in page_ids)}] /Count {len(page_ids)} >>'
+    
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref_offset = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode('latin-1')
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('latin-1')
+    with open(path, 'wb') as file:
+        file.write(output)
+
+def write_png(path: str, text: str, width: int = 1700, line_height: int = 28, chars_per_line: int = 100):
+    """Render text onto a white page image, as a phone scan would look to the OCR path"""
+    lines = []
+    for paragraph in text.split('\n'):
+        lines.extend(paragraph[start:start + chars_per_line] for start in range(0, len(paragraph), chars_per_line))
+    image = Image.new('L', (width, max(200, 80 + line_height * len(lines))), color=255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((60, 40 + index * line_height), line, fill=0)
+    image.save(path)
+
+WRITERS = {
+    'txt': write_txt,
+    'pdf': write_pdf,
+    'docx': write_docx,
+    'rtf': write_rtf,
+    'odt': write_odt,
+    'png': write_png,
+}
+
+def build_corpus(directory: str, formats=FORMATS, sizes=None, docs_per_size: int = 3, seed: int = 0) -> list:
+    """Write the corpus into directory and return (format, size, path) for every document"""
+    sizes = sizes or SIZES
+    os.makedirs(directory, exist_ok=True)
+    documents = []
+    for file_format in formats:
+        for size_name, words in sizes.items():
+            if file_format == 'png':
+                words = IMAGE_SIZES.get(size_name, min(words, IMAGE_SIZES['large']))
+            for index in range(docs_per_size):
+                # Name encodes everything the content depends on, so stale files are never reused
+                path = os.path.join(directory, f'{words}w-{seed + index}.{file_format}')
+                if not os.path.exists(path):
+                    WRITERS[file_format](path, make_text(words, seed=seed + index))
+                documents.append((file_format, size_name, path))
+    return documents
@@ -0,0 +1,73 @@
+"""
+Compare python-docx with the streaming DocxWriter for plain-text documents
+
+Usage: python benchmarks/docx_writer_benchmark.py [--lines 50000] [--repeat 1]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from docx_writer import DocxWriter, iter_paragraphs
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua <tag> & "quoted" café naïve 東京').split()
+
+def make_text(lines: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return '\n'.join(' '.join(rng.choices(WORDS, k=rng.randint(3, 25))) for _ in range(lines))
+
+def write_python_docx(text: str, output):
+    doc = Document()
+    doc.add_heading('Converted from benchmark.txt', 0)
+    for paragraph_text in iter_paragraphs(text):
+        doc.add_paragraph(paragraph_text)
+    doc.save(output)
+
+def write_streaming(text: str, output):
+    with DocxWriter(output) as writer:
+        writer.add_paragraph('Converted from benchmark.txt', style='Title')
+        writer.add_paragraphs(iter_paragraphs(text))
+
+def measure(writer, text: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        output = io.BytesIO()
+        started = time.perf_counter()
+        writer(text, output)
+        timings.append(time.perf_counter() - started)
+    
+    # tracemalloc only sees Python allocations, not lxml's C heap
+    tracemalloc.start()
+    writer(text, io.BytesIO())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {'best_seconds': min(timings), 'peak_alloc_mb': peak / 1024 / 1024, 'size_kb': len(output.getvalue()) / 1024}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+    
+    text = make_text(args.lines)
+    results = {name: measure(writer, text, args.repeat)
+               for name, writer in (('python-docx', write_python_docx), ('streaming', write_streaming))}
+    
+    print(f"{args.lines} lines, best of {args.repeat}")
+    for name, result in results.items():
+        print(f"  {name:<12} {result['best_seconds']:8.3f} s  {result['peak_alloc_mb']:8.1f} MB peak (Python heap)  "
+              f"{result['size_kb']:8.1f} KB")
+    speedup = results['python-docx']['best_seconds'] / results['streaming']['best_seconds']
+    print(f"  streaming writer is {speedup:.1f}x faster")
+
+if __name__ == '__main__':
+    main()
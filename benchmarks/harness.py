@@ -0,0 +1,74 @@
+"""
+Shared helpers for the benchmark scripts: timing summaries, peak RSS and JSON reports
+"""
+
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def summarize(latencies: list) -> dict:
+    """Throughput and latency figures for a list of per-document timings in seconds"""
+    total = sum(latencies)
+    return {
+        'docs': len(latencies),
+        'docs_per_sec': round(len(latencies) / total, 3) if total else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'total_seconds': round(total, 4),
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def write_report(name: str, settings: dict, results: dict, output_path: str = None) -> dict:
+    """Print the report as JSON and optionally save it for comparison with another run"""
+    report = {
+        'benchmark': name,
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': settings,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    return report
+
+def compare_reports(baseline_path: str, report: dict, metric: str = 'p50_ms'):
+    """Print how each result's metric moved relative to a saved baseline report"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    print(f"\n{metric} vs {baseline.get('revision')} ({baseline_path}):", file=sys.stderr)
+    for key, result in report['results'].items():
+        before = baseline['results'].get(key, {}).get(metric)
+        after = result.get(metric)
+        if before and after:
+            print(f"  {key:<28} {before:>10.2f} -> {after:>10.2f}  ({(after - before) / before:+.1%})", file=sys.stderr)
@@ -0,0 +1,99 @@
+"""
+End-to-end translate_file timing against the offline fake translation backend
+
+For each document size, translates a synthetic TXT file and reports wall time,
+upstream request counts, characters sent, and the segment and batch counts from the
+Translator. With --memory, each document is translated twice against a fresh
+translation memory to show the cold and warm cost.
+
+Usage: python benchmarks/translation_benchmark.py [--sizes small,medium] [--latency 0.05]
+                                                  [--rate-limit 0] [--concurrency 4] [--memory]
+                                                  [--output run.json] [--compare baseline.json]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import harness
+from file_converter import FileConverter
+from translation_backends import FakeTranslationBackend
+from translation_memory import TranslationMemory
+from translator import Translator
+
+def translate_once(translator: Translator, backend: FakeTranslationBackend, path: str, target_lang: str) -> dict:
+    backend.reset_stats()
+    translator.counters = dict.fromkeys(translator.counters, 0)
+    started = time.perf_counter()
+    translator.translate_file(path, target_lang, os.path.basename(path), output=io.BytesIO())
+    elapsed = time.perf_counter() - started
+    return {'seconds': elapsed, **backend.stats(), **translator.counters}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(corpus.SIZES))
+    parser.add_argument('--docs', type=int, default=2, help='documents per size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--target-lang', default='es')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake backend seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0, help='fake backend requests/sec, 0 = unlimited')
+    parser.add_argument('--concurrency', type=int, default=None, help='Translator.translation_concurrency')
+    parser.add_argument('--max-retries', type=int, default=None)
+    parser.add_argument('--memory', action='store_true', help='enable a fresh translation memory per document')
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'fileconvertor-corpus'))
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--compare', help='baseline JSON report to compare p50 latency against')
+    args = parser.parse_args()
+    
+    sizes = {size_name: corpus.SIZES[size_name] for size_name in args.sizes.split(',') if size_name}
+    documents = corpus.build_corpus(args.corpus_dir, ['txt'], sizes, args.docs, args.seed)
+    
+    backend = FakeTranslationBackend(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                                     seed=args.seed)
+    # No conversion cache, so every run pays for extraction
+    file_converter = FileConverter()
+    file_converter.cache = None
+    translator = Translator(file_converter=file_converter, backend=backend)
+    if args.concurrency is not None:
+        translator.translation_concurrency = args.concurrency
+    if args.max_retries is not None:
+        translator.max_retries = args.max_retries
+    
+    runs = {}
+    with tempfile.TemporaryDirectory() as memory_dir:
+        for _, size_name, path in documents:
+            translator.translation_memory = None
+            if args.memory:
+                translator.translation_memory = TranslationMemory(os.path.join(memory_dir, f'{size_name}-{len(runs)}.sqlite3'))
+            passes = ('cold', 'warm') if args.memory else ('cold',)
+            for pass_name in passes:
+                runs.setdefault(f'{size_name}/{pass_name}', []).append(
+                    translate_once(translator, backend, path, args.target_lang)
+                )
+    
+    results = {}
+    for key, key_runs in runs.items():
+        result = harness.summarize([run['seconds'] for run in key_runs])
+        # Counts are per document; the corpus documents of one size are the same length
+        for counter in ('translate_requests', 'characters', 'rate_limited', 'failures',
+                        'segments', 'memory_hits', 'batches', 'batch_splits'):
+            result[counter] = round(sum(run[counter] for run in key_runs) / len(key_runs), 1)
+        result['peak_rss_mb'] = harness.peak_rss_mb()
+        results[key] = result
+    
+    settings = {'sizes': sizes, 'docs': args.docs, 'seed': args.seed, 'latency': args.latency,
+                'jitter': args.jitter, 'rate_limit': args.rate_limit, 'memory': args.memory,
+                'concurrency': translator.translation_concurrency, 'max_chunk_size': translator.max_chunk_size}
+    report = harness.write_report('translation', settings, results, args.output)
+    if args.compare:
+        harness.compare_reports(args.compare, report)
+
+if __name__ == '__main__':
+    main()
@@ -3,69 +3,176 @@ Main Telegram bot implementation with inline keyboard interface
 Compatible with python-telegram-bot v21.6
 """
 
+import asyncio
+import io
 import logging
 import os
-import tempfile
+import signal
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-try:
-    from telegram.constants import ParseMode
-except ImportError:
-    from telegram import ParseMode
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, MessageHandler, Filters, CallbackContext
+from telegram.constants import ParseMode
+from telegram.ext import (
+    Application, ApplicationHandlerStop, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler,
+    ContextTypes, filters
+)
 
-from config import BOT_TOKEN, SUPPORTED_LANGUAGES
-from file_converter import FileConverter
-from translator import Translator
-from utils import cleanup_file, get_file_extension, format_file_size
-import json
+from config import (
+    BOT_TOKEN, SUPPORTED_LANGUAGES, SUPPORTED_TEXT_FORMATS, SUPPORTED_IMAGE_FORMATS, JOB_LARGE_FILE_SIZE, IN_MEMORY_UPLOAD_LIMIT,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, BOT_HEARTBEAT_INTERVAL
+)
+from access_control import AuthorizedUsers
+from bot_persistence import StorePersistence
+from storage import Store
+import tracing
+from metrics import MetricsRegistry
+from supervisor import write_heartbeat
+from update_dedup import UpdateDeduplicator
+from workspace import WorkspaceManager
+from jobs import Job, JobScheduler, run_conversion, run_translation, PRIORITY_NORMAL, PRIORITY_LOW
+from utils import get_file_extension, format_file_size, extract_filename_without_extension
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# Extracted uploads kept in memory so "convert then translate" parses a file only once
+MAX_STORED_EXTRACTIONS = 50
+
 class TelegramBot:
     def __init__(self):
-        self.updater = Updater(token=BOT_TOKEN, use_context=True)
-        self.dispatcher = self.updater.dispatcher
-        self.file_converter = FileConverter()
-        self.translator = Translator()
+        self.store = Store()
+        # Handlers only await I/O and queue jobs, so updates from different chats can run concurrently
+        self.application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .concurrent_updates(True)
+            .persistence(StorePersistence(self.store))
+            .post_init(self.on_startup)
+            .post_shutdown(self.on_shutdown)
+            .build()
+        )
+        self.extractions = OrderedDict()  # file_unique_id -> ExtractedDocument
+        self.job_scheduler = JobScheduler(store=self.store)
+        # Uploads that must be on disk live in per-job workspaces under TEMP_DIR
+        self.workspaces = WorkspaceManager()
+        self.workspaces.start()
+        self.heartbeat_task = None  # Started in on_startup
+        # Stage latencies and job counts, written to METRICS_PATH for the dashboard
+        self.metrics = MetricsRegistry()
+        self.metrics.gauge('queue_depth', self.job_scheduler.pending_count)
+        self.metrics.gauge('jobs_running', self.job_scheduler.running_count)
+        self.metrics.gauge('workspaces_active', lambda: self.workspaces.stats()['active_workspaces'])
+        self.metrics.gauge('workspace_reserved_bytes', lambda: self.workspaces.stats()['reserved_bytes'])
+        # Webhook workers can each receive a redelivered update, so they share a seen-set
+        self.update_deduplicator = UpdateDeduplicator() if WEBHOOK_URL else None
         self.authorized_users_file = 'authorized_users.json'
+        self.store.import_authorized_users_file(self.authorized_users_file)
+        self.authorized_users = AuthorizedUsers(self.store)
+        # The dashboard sends SIGHUP after editing the user list
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.authorized_users.mark_stale())
         self.setup_handlers()
     
-    def load_authorized_users(self):
-        """Load authorized users from JSON file"""
+    def get_extraction(self, file_unique_id):
+        """Return the stored extracted document for an upload, or None"""
+        extracted = self.extractions.get(file_unique_id)
+        if extracted is not None:
+            self.extractions.move_to_end(file_unique_id)
+        return extracted
+    
+    def remember_extraction(self, file_unique_id, extracted):
+        """Keep an upload's extracted document for later jobs on the same file"""
+        if not file_unique_id or extracted is None:
+            return
+        self.extractions[file_unique_id] = extracted
+        self.extractions.move_to_end(file_unique_id)
+        while len(self.extractions) > MAX_STORED_EXTRACTIONS:
+            self.extractions.popitem(last=False)
+    
+    def job_priority(self, file_size):
+        """Large uploads yield to small ones so quick jobs aren't stuck behind heavy OCR"""
+        return PRIORITY_LOW if file_size and file_size > JOB_LARGE_FILE_SIZE else PRIORITY_NORMAL
+    
+    async def download_upload(self, context: ContextTypes.DEFAULT_TYPE, document, keep_on_disk: bool = False):
+        """Download an upload; returns (bytes, None), or (path, workspace) for PDFs, large files and keep_on_disk"""
+        file_extension = get_file_extension(document.file_name)
+        # PDFs stay on disk so they can be memory-mapped and split across worker processes
+        if not keep_on_disk and file_extension != '.pdf' and document.file_size <= IN_MEMORY_UPLOAD_LIMIT:
+            file = await context.bot.get_file(document.file_id)
+            return bytes(await file.download_as_bytearray()), None
+        
+        # Waits while the disk quota is used up by other jobs
+        workspace = await asyncio.to_thread(self.workspaces.create, document.file_size)
         try:
-            if os.path.exists(self.authorized_users_file):
-                with open(self.authorized_users_file, 'r') as f:
-                    return json.load(f)
-            return []
-        except Exception as e:
-            logger.error(f"Error loading authorized users: {e}")
-            return []
+            file = await context.bot.get_file(document.file_id)
+            file_path = workspace.file_path(f'upload{file_extension}')
+            await file.download_to_drive(file_path)
+            return file_path, workspace
+        except BaseException:
+            workspace.release()
+            raise
+    
+    def record_job_metrics(self, job, job_metrics: dict = None):
+        """Count a finished job and fold in the stage timings its worker recorded"""
+        # The scheduler already timed the job, from submission to the worker finishing
+        tracing.record_span('job', job.created_at, job.finished_at, parent=job.context['trace'],
+                            error=None if job.error is None else f'{type(job.error).__name__}: {job.error}',
+                            job_id=job.job_id, kind=job.kind,
+                            queue_ms=round((job.started_at - job.created_at) * 1000, 1) if job.started_at else None)
+        file_extension = get_file_extension(job.context['original_filename']).lower()
+        # Filenames are user input, so only known formats become label values
+        if file_extension not in SUPPORTED_TEXT_FORMATS + SUPPORTED_IMAGE_FORMATS:
+            file_format = 'other'
+        else:
+            file_format = file_extension.lstrip('.')
+        self.metrics.record_job(
+            job.kind, file_format, job.status, job_metrics,
+            queue_seconds=job.started_at - job.created_at if job.started_at else None,
+            total_seconds=job.finished_at - job.created_at if job.finished_at else None
+        )
+    
+    def release_pending_upload(self, user_data: dict):
+        """Drop a translate-mode upload that is waiting for a target language"""
+        workspace = self.workspaces.get(user_data.pop('workspace_id', None))
+        if workspace is not None:
+            workspace.release()
+        user_data.pop('file_path', None)
+        user_data.pop('trace', None)
     
-    def is_user_authorized(self, user_id):
+    async def is_user_authorized(self, user_id):
         """Check if user is authorized to use the bot"""
-        authorized_users = self.load_authorized_users()
-        return str(user_id) in authorized_users or len(authorized_users) == 0
+        if self.authorized_users.needs_recheck():
+            # Polling the store's ACL version is a database round trip
+            await asyncio.to_thread(self.authorized_users.reload_if_changed)
+        return self.authorized_users.is_authorized(user_id)
         
     def setup_handlers(self):
         """Setup all command and callback handlers"""
+        # Runs before every other handler group
+        if self.update_deduplicator:
+            self.application.add_handler(TypeHandler(Update, self.drop_duplicate_update), group=-1)
+        
         # Command handlers
-        self.dispatcher.add_handler(CommandHandler("start", self.start_command))
-        self.dispatcher.add_handler(CommandHandler("help", self.help_command))
+        self.application.add_handler(CommandHandler("start", self.start_command))
+        self.application.add_handler(CommandHandler("help", self.help_command))
         
         # Callback query handlers
-        self.dispatcher.add_handler(CallbackQueryHandler(self.handle_callback))
+        self.application.add_handler(CallbackQueryHandler(self.handle_callback))
         
         # Message handlers
-        self.dispatcher.add_handler(MessageHandler(Filters.document, self.handle_document))
-        self.dispatcher.add_handler(MessageHandler(Filters.photo, self.handle_photo))
-        self.dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, self.handle_text))
+        self.application.add_handler(MessageHandler(filters.Document.ALL, self.handle_document))
+        self.application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
+        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text))
 
-    def start_command(self, update: Update, context: CallbackContext):
+    async def drop_duplicate_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Stop processing updates another worker has already handled"""
+        if await asyncio.to_thread(self.update_deduplicator.is_duplicate, update.update_id):
+            logger.info(f"Dropping duplicate update {update.update_id}")
+            raise ApplicationHandlerStop
+
+    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user_id = update.effective_user.id
         
         # Check if user is authorized
-        if not self.is_user_authorized(user_id):
+        if not await self.is_user_authorized(user_id):
             unauthorized_message = (
                 "🚫 *Access Denied*\n\n"
                 "You are not authorized to use this bot.\n"
@@ -73,7 +180,7 @@ class TelegramBot:
                 f"Your User ID: `{user_id}`\n"
                 "Send this ID to the bot administrator."
             )
-            update.message.reply_text(
+            await update.message.reply_text(
                 unauthorized_message,
                 parse_mode=ParseMode.MARKDOWN
             )
@@ -94,17 +201,17 @@ class TelegramBot:
             "Choose an option below to get started:"
         )
         
-        update.message.reply_text(
+        await update.message.reply_text(
             welcome_message,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=reply_markup
         )
 
-    def help_command(self, update: Update, context: CallbackContext):
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
-        self.show_help(update, context)
+        await self.show_help(update, context)
 
-    def show_help(self, update: Update, context: CallbackContext):
+    async def show_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show help information"""
         help_text = (
             "🔧 *How to use this bot:*\n\n"
@@ -130,45 +237,45 @@ class TelegramBot:
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         if update.callback_query:
-            update.callback_query.edit_message_text(
+            await update.callback_query.edit_message_text(
                 help_text,
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=reply_markup
             )
         else:
-            update.message.reply_text(
+            await update.message.reply_text(
                 help_text,
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=reply_markup
             )
 
-    def handle_callback(self, update: Update, context: CallbackContext):
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle callback queries from inline keyboards"""
         query = update.callback_query
-        query.answer()
+        await query.answer()
         
         user_id = update.effective_user.id
-        if not self.is_user_authorized(user_id):
-            query.edit_message_text("🚫 Access denied. Please contact administrator.")
+        if not await self.is_user_authorized(user_id):
+            await query.edit_message_text("🚫 Access denied. Please contact administrator.")
             return
         
         data = query.data
         
         if data == 'convert_to_docx':
-            self.start_file_conversion(update, context)
+            await self.start_file_conversion(update, context)
         elif data == 'translate_file':
-            self.start_file_translation(update, context)
+            await self.start_file_translation(update, context)
         elif data == 'help':
-            self.show_help(update, context)
+            await self.show_help(update, context)
         elif data == 'back_to_main':
-            self.show_main_menu(update, context)
+            await self.show_main_menu(update, context)
         elif data.startswith('translate_to_'):
             target_lang = data.replace('translate_to_', '')
-            self.process_translation(update, context, target_lang)
+            await self.process_translation(update, context, target_lang)
         elif data == 'show_more_languages':
-            self.show_language_selection(update, context, show_all=True)
+            await self.show_language_selection(update, context, show_all=True)
 
-    def start_file_conversion(self, update: Update, context: CallbackContext):
+    async def start_file_conversion(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start file conversion workflow"""
         context.user_data['mode'] = 'convert'
         
@@ -187,13 +294,13 @@ class TelegramBot:
         keyboard = [[InlineKeyboardButton("🔙 Back to Main Menu", callback_data='back_to_main')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        update.callback_query.edit_message_text(
+        await update.callback_query.edit_message_text(
             message,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=reply_markup
         )
 
-    def start_file_translation(self, update: Update, context: CallbackContext):
+    async def start_file_translation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start file translation workflow"""
         context.user_data['mode'] = 'translate'
         
@@ -213,13 +320,13 @@ class TelegramBot:
         keyboard = [[InlineKeyboardButton("🔙 Back to Main Menu", callback_data='back_to_main')]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        update.callback_query.edit_message_text(
+        await update.callback_query.edit_message_text(
             message,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=reply_markup
         )
 
-    def show_main_menu(self, update: Update, context: CallbackContext):
+    async def show_main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show the main menu"""
         keyboard = [
             [InlineKeyboardButton("📄 Convert Any File to DOCX", callback_data='convert_to_docx')],
@@ -233,13 +340,13 @@ class TelegramBot:
             "Choose an option below:"
         )
         
-        update.callback_query.edit_message_text(
+        await update.callback_query.edit_message_text(
             message,
             parse_mode=ParseMode.MARKDOWN,
             reply_markup=reply_markup
         )
 
-    def show_language_selection(self, update: Update, context: CallbackContext, show_all=False):
+    async def show_language_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE, show_all=False):
         """Show language selection menu"""
         keyboard = []
         
@@ -278,27 +385,27 @@ class TelegramBot:
         )
         
         if update.callback_query:
-            update.callback_query.edit_message_text(
+            await update.callback_query.edit_message_text(
                 message,
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=reply_markup
             )
         else:
-            update.message.reply_text(
+            await update.message.reply_text(
                 message,
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=reply_markup
             )
 
-    def handle_document(self, update: Update, context: CallbackContext):
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle document uploads"""
         user_id = update.effective_user.id
-        if not self.is_user_authorized(user_id):
-            update.message.reply_text("🚫 Access denied. Please contact administrator.")
+        if not await self.is_user_authorized(user_id):
+            await update.message.reply_text("🚫 Access denied. Please contact administrator.")
             return
             
         if 'mode' not in context.user_data:
-            update.message.reply_text(
+            await update.message.reply_text(
                 "❌ Please select a mode first using /start",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data='back_to_main')]])
             )
@@ -308,109 +415,266 @@ class TelegramBot:
         file_size = document.file_size
         
         if file_size > 20 * 1024 * 1024:  # 20MB limit
-            update.message.reply_text(
+            await update.message.reply_text(
                 f"❌ File too large! Maximum size is 20MB.\n"
                 f"Your file: {format_file_size(file_size)}"
             )
             return
         
+        workspace = None
         try:
             # Send processing message
-            processing_msg = update.message.reply_text("⏳ Processing your file...")
-            
-            # Download file
-            file = context.bot.get_file(document.file_id)
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                file.download(temp_file.name)
-                temp_file_path = temp_file.name
+            processing_msg = await update.message.reply_text("⏳ Processing your file...")
             
             mode = context.user_data.get('mode')
             
+            # Download file; the job's trace starts here and continues in the worker process
+            trace = tracing.new_trace()
+            with self.metrics.timed('download', kind=mode), \
+                    tracing.span('download', parent=trace, size=file_size):
+                # A translate upload waits for a language choice, and only its path is persisted
+                upload, workspace = await self.download_upload(context, document, keep_on_disk=mode == 'translate')
+            
             if mode == 'convert':
-                # Simple text extraction for demo
-                update.message.reply_text("✅ File conversion feature will be implemented!")
+                job = Job(
+                    'convert',
+                    user_id,
+                    run_conversion,
+                    (upload, document.file_name, document.file_unique_id,
+                     self.get_extraction(document.file_unique_id), trace),
+                    priority=self.job_priority(file_size),
+                    context={
+                        'chat_id': update.effective_chat.id,
+                        'message_id': processing_msg.message_id,
+                        'workspace': workspace,
+                        'original_filename': document.file_name,
+                        'file_unique_id': document.file_unique_id,
+                        'trace': trace
+                    }
+                )
+                position, completion = await self.job_scheduler.submit_async(job)
+                # The job owns the workspace from here on
+                workspace = None
+                context.application.create_task(self.deliver_conversion(completion))
+                await processing_msg.edit_text(f"⏳ File queued for conversion (position {position})...")
+                return
                 
             elif mode == 'translate':
-                # Store file for translation
-                context.user_data['file_path'] = temp_file_path
+                # Store file for translation, replacing any upload still waiting for a language
+                self.release_pending_upload(context.user_data)
+                context.user_data['file_path'] = upload
+                context.user_data['workspace_id'] = workspace.workspace_id
+                # Swept after WORKSPACE_TTL if no language is ever picked
+                workspace = None
                 context.user_data['original_filename'] = document.file_name
+                context.user_data['file_unique_id'] = document.file_unique_id
+                context.user_data['file_size'] = file_size
+                context.user_data['trace'] = trace
                 
                 # Show language selection
-                self.show_language_selection(update, context)
-                processing_msg.delete()
+                await self.show_language_selection(update, context)
+                await processing_msg.delete()
                 return
             
             # Cleanup
-            cleanup_file(temp_file_path)
-            processing_msg.delete()
+            if workspace is not None:
+                workspace.release()
+            await processing_msg.delete()
             
         except Exception as e:
             logger.error(f"Error processing document: {e}")
-            update.message.reply_text(f"❌ Error processing file: {str(e)}")
-            if 'temp_file_path' in locals():
-                cleanup_file(temp_file_path)
+            await update.message.reply_text(f"❌ Error processing file: {str(e)}")
+            if workspace is not None:
+                workspace.release()
 
-    def handle_photo(self, update: Update, context: CallbackContext):
+    async def deliver_conversion(self, completion):
+        """Wait for a conversion job and send the result back to the chat"""
+        job = await completion
+        bot = self.application.bot
+        chat_id = job.context['chat_id']
+        try:
+            if job.error is not None:
+                self.record_job_metrics(job)
+                await bot.edit_message_text(f"❌ Error processing file: {job.error}", chat_id=chat_id,
+                                      message_id=job.context['message_id'])
+                return
+            
+            docx_bytes, extracted, job_metrics = job.result
+            self.record_job_metrics(job, job_metrics)
+            self.remember_extraction(job.context['file_unique_id'], extracted)
+            with self.metrics.timed('upload', kind=job.kind), \
+                    tracing.span('upload', parent=job.context['trace'], job_id=job.job_id, size=len(docx_bytes)):
+                await bot.send_document(
+                    chat_id=chat_id,
+                    document=io.BytesIO(docx_bytes),
+                    filename=f"{extract_filename_without_extension(job.context['original_filename'])}.docx",
+                    caption="✅ File converted to DOCX!"
+                )
+            await bot.delete_message(chat_id=chat_id, message_id=job.context['message_id'])
+        except Exception as e:
+            logger.error(f"Error delivering conversion for chat {chat_id}: {e}")
+        finally:
+            if job.context['workspace'] is not None:
+                job.context['workspace'].release()
+
+    async def deliver_translation(self, completion):
+        """Wait for a translation job and send the result back to the chat"""
+        job = await completion
+        bot = self.application.bot
+        chat_id = job.context['chat_id']
+        message_id = job.context['message_id']
+        try:
+            if job.error is not None:
+                self.record_job_metrics(job)
+                await bot.edit_message_text(f"❌ Translation error: {job.error}", chat_id=chat_id, message_id=message_id)
+                return
+            
+            docx_bytes, extracted, job_metrics = job.result
+            self.record_job_metrics(job, job_metrics)
+            self.remember_extraction(job.context['file_unique_id'], extracted)
+            target_lang = job.context['target_lang']
+            with self.metrics.timed('upload', kind=job.kind), \
+                    tracing.span('upload', parent=job.context['trace'], job_id=job.job_id, size=len(docx_bytes)):
+                await bot.send_document(
+                    chat_id=chat_id,
+                    document=io.BytesIO(docx_bytes),
+                    filename=f"{extract_filename_without_extension(job.context['original_filename'])}_{target_lang}.docx"
+                )
+            lang_name = SUPPORTED_LANGUAGES.get(target_lang, target_lang)
+            await bot.edit_message_text(f"✅ Translation to {lang_name} complete!", chat_id=chat_id, message_id=message_id)
+        except Exception as e:
+            logger.error(f"Error delivering translation for chat {chat_id}: {e}")
+        finally:
+            if job.context['workspace'] is not None:
+                job.context['workspace'].release()
+
+    async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle photo uploads"""
         user_id = update.effective_user.id
-        if not self.is_user_authorized(user_id):
-            update.message.reply_text("🚫 Access denied. Please contact administrator.")
+        if not await self.is_user_authorized(user_id):
+            await update.message.reply_text("🚫 Access denied. Please contact administrator.")
             return
             
         if 'mode' not in context.user_data:
-            update.message.reply_text(
+            await update.message.reply_text(
                 "❌ Please select a mode first using /start",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data='back_to_main')]])
             )
             return
         
-        update.message.reply_text("✅ Photo processing feature will be implemented!")
+        await update.message.reply_text("✅ Photo processing feature will be implemented!")
 
-    def handle_text(self, update: Update, context: CallbackContext):
+    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle text messages"""
         user_id = update.effective_user.id
-        if not self.is_user_authorized(user_id):
-            update.message.reply_text("🚫 Access denied. Please contact administrator.")
+        if not await self.is_user_authorized(user_id):
+            await update.message.reply_text("🚫 Access denied. Please contact administrator.")
             return
             
         if 'mode' not in context.user_data:
-            update.message.reply_text(
+            await update.message.reply_text(
                 "❌ Please select a mode first using /start",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data='back_to_main')]])
             )
             return
         
-        update.message.reply_text("✅ Text processing feature will be implemented!")
+        await update.message.reply_text("✅ Text processing feature will be implemented!")
 
-    def process_translation(self, update: Update, context: CallbackContext, target_lang: str):
+    async def process_translation(self, update: Update, context: ContextTypes.DEFAULT_TYPE, target_lang: str):
         """Process translation with selected language"""
+        file_path = context.user_data.get('file_path')
+        workspace = self.workspaces.get(context.user_data.get('workspace_id'))
+        if file_path and (workspace is None or not os.path.exists(file_path)):
+            # The upload outlived WORKSPACE_TTL and was swept
+            file_path = None
+        if not file_path:
+            context.user_data.pop('file_path', None)
+            context.user_data.pop('workspace_id', None)
+            await update.callback_query.edit_message_text("❌ Please send a file to translate first.")
+            return
+        
         try:
-            update.callback_query.edit_message_text("⏳ Translating your file...")
-            
-            # For now, just show success message
-            lang_name = SUPPORTED_LANGUAGES.get(target_lang, target_lang)
-            update.callback_query.edit_message_text(
-                f"✅ Translation to {lang_name} will be implemented!"
+            original_filename = context.user_data.get('original_filename')
+            file_unique_id = context.user_data.get('file_unique_id')
+            # Not persisted, so a restart between upload and language choice starts a new trace
+            trace = context.user_data.get('trace') or tracing.new_trace()
+            job = Job(
+                'translate',
+                update.effective_user.id,
+                run_translation,
+                (file_path, target_lang, original_filename, file_unique_id, self.get_extraction(file_unique_id), trace),
+                priority=self.job_priority(context.user_data.get('file_size')),
+                context={
+                    'chat_id': update.effective_chat.id,
+                    'message_id': update.callback_query.message.message_id,
+                    'workspace': workspace,
+                    'original_filename': original_filename,
+                    'file_unique_id': file_unique_id,
+                    'target_lang': target_lang,
+                    'trace': trace
+                }
             )
-            
-            # Cleanup stored file
-            file_path = context.user_data.get('file_path')
-            if file_path:
-                cleanup_file(file_path)
-                context.user_data.clear()
+            position, completion = await self.job_scheduler.submit_async(job)
+            # The job owns the stored file and its workspace from here on
+            context.user_data.clear()
+            context.application.create_task(self.deliver_translation(completion))
+            await update.callback_query.edit_message_text(f"⏳ Translation queued (position {position})...")
                 
         except Exception as e:
             logger.error(f"Error in translation: {e}")
-            update.callback_query.edit_message_text(f"❌ Translation error: {str(e)}")
+            await update.callback_query.edit_message_text(f"❌ Translation error: {str(e)}")
+            self.release_pending_upload(context.user_data)
+            context.user_data.clear()
+
+    async def on_startup(self, application: Application):
+        """Start heartbeating once the application is initialized"""
+        self.heartbeat_task = asyncio.create_task(self.heartbeat_loop())
+    
+    async def heartbeat_loop(self):
+        """Tell the dashboard's supervisor the event loop is alive and responsive, and publish metrics"""
+        while True:
+            try:
+                write_heartbeat()
+            except OSError as e:
+                logger.error(f"Error writing heartbeat: {e}")
+            try:
+                self.metrics.write()
+            except OSError as e:
+                logger.error(f"Error writing metrics: {e}")
+            await asyncio.sleep(BOT_HEARTBEAT_INTERVAL)
+    
+    async def on_shutdown(self, application: Application):
+        """Stop the job workers once the application has shut down"""
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+        self.job_scheduler.shutdown(wait=False)
+        self.workspaces.stop()
 
     def run(self):
         """Run the bot"""
         logger.info("Starting Telegram bot...")
-        self.updater.start_polling()
         logger.info("Bot is running!")
-        self.updater.idle()
+        # Both block until the process receives a stop signal
+        if WEBHOOK_URL:
+            self.run_webhook()
+        else:
+            self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+    def run_webhook(self):
+        """Receive updates on a local HTTP endpoint instead of long polling"""
+        webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}"
+        logger.info(f"Listening for webhook updates on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+        # Every worker registers the same URL, so whichever starts last leaves it unchanged
+        self.application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=webhook_url,
+            secret_token=WEBHOOK_SECRET_TOKEN or None,
+            allowed_updates=Update.ALL_TYPES
+        )
 
     def stop(self):
         """Stop the bot"""
         logger.info("Stopping Telegram bot...")
-        self.updater.stop()
\ No newline at end of file
+        self.application.stop_running()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+python-telegram-bot persistence that keeps per-user session state in the shared store
+"""
+
+import asyncio
+import logging
+import time
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Only these user_data keys are JSON-serialisable workflow state worth surviving a restart;
+# uploads waiting for a language are kept on disk in a workspace and referenced by path
+SESSION_KEYS = ('mode', 'file_path', 'workspace_id', 'original_filename', 'file_unique_id', 'file_size')
+
+class StorePersistence(BasePersistence):
+    def __init__(self, store, update_interval: float = 5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self._synced_at = {}  # user_id -> updated_at of the session row this process last read or wrote
+    
+    async def get_user_data(self):
+        loaded_at = time.time()
+        sessions = await asyncio.to_thread(self.store.load_sessions)
+        self._synced_at = {int(user_id): loaded_at for user_id in sessions}
+        return {int(user_id): data for user_id, data in sessions.items()}
+    
+    async def update_user_data(self, user_id: int, data: dict):
+        session = {key: data[key] for key in SESSION_KEYS if key in data}
+        try:
+            if session:
+                self._synced_at[user_id] = await asyncio.to_thread(self.store.save_session, user_id, session)
+            else:
+                await asyncio.to_thread(self.store.delete_session, user_id)
+                self._synced_at.pop(user_id, None)
+        except Exception as e:
+            logger.error(f"Error saving session for user {user_id}: {e}")
+    
+    async def drop_user_data(self, user_id: int):
+        await asyncio.to_thread(self.store.delete_session, user_id)
+        self._synced_at.pop(user_id, None)
+    
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        """Pick up a session saved by another worker since this process last saw it"""
+        try:
+            stored = await asyncio.to_thread(self.store.load_session, user_id)
+        except Exception as e:
+            logger.error(f"Error loading session for user {user_id}: {e}")
+            return
+        if stored is None:
+            return
+        session, updated_at = stored
+        # Rows this process wrote itself may be older than changes it has not flushed yet
+        if updated_at <= self._synced_at.get(user_id, 0):
+            return
+        for key in SESSION_KEYS:
+            if key in session:
+                user_data[key] = session[key]
+            else:
+                user_data.pop(key, None)
+        self._synced_at[user_id] = updated_at
+    
+    # Chat data, bot data, callback data and conversations are not persisted
+    
+    async def get_chat_data(self):
+        return {}
+    
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+    
+    async def drop_chat_data(self, chat_id: int):
+        pass
+    
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+    
+    async def get_bot_data(self):
+        return {}
+    
+    async def update_bot_data(self, data: dict):
+        pass
+    
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+    
+    async def get_callback_data(self):
+        return None
+    
+    async def update_callback_data(self, data):
+        pass
+    
+    async def get_conversations(self, name: str):
+        return {}
+    
+    async def update_conversation(self, name: str, key, new_state):
+        pass
+    
+    async def flush(self):
+        pass
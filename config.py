@@ -12,6 +12,47 @@ MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB max file size
 SUPPORTED_TEXT_FORMATS = ['.txt', '.pdf', '.docx', '.doc', '.rtf', '.odt']
 SUPPORTED_IMAGE_FORMATS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
 
+# Parallel PDF extraction (worker processes; 0 or 1 keeps extraction on a single core)
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', '0'))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '20'))
+
+# Webhook delivery (leave WEBHOOK_URL empty to use long polling)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # Public base URL, e.g. https://bot.example.com
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram-webhook')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+
+# Shared database for authorized users, session state and job records (SQLite unless DATABASE_URL is set)
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///' + os.path.join(os.getcwd(), 'bot_state.sqlite3'))
+if DATABASE_URL.startswith('postgres://'):
+    # SQLAlchemy only accepts the postgresql:// scheme that some hosts don't use
+    DATABASE_URL = 'postgresql://' + DATABASE_URL[len('postgres://'):]
+
+# Seconds between checks of the shared store for authorized-user changes
+ACL_RECHECK_INTERVAL = float(os.getenv('ACL_RECHECK_INTERVAL', '2'))
+
+# Background jobs (see jobs.py)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))  # Worker processes running conversions/translations
+JOB_PER_USER_LIMIT = int(os.getenv('JOB_PER_USER_LIMIT', '1'))  # Jobs a single user may have running at once
+JOB_LARGE_FILE_SIZE = int(os.getenv('JOB_LARGE_FILE_SIZE', str(5 * 1024 * 1024)))  # Larger uploads run at low priority
+IN_MEMORY_UPLOAD_LIMIT = int(os.getenv('IN_MEMORY_UPLOAD_LIMIT', str(8 * 1024 * 1024)))  # Smaller non-PDF uploads for conversion never touch disk
+DOCX_FAST_WRITER = os.getenv('DOCX_FAST_WRITER', 'True').lower() == 'true'  # Stream plain-text DOCX output (see docx_writer.py)
+
+# OCR settings (see ocr_engine.py)
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '0'))
+OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')
+OCR_PSM = int(os.getenv('OCR_PSM', '3'))  # Tesseract page segmentation mode
+OCR_OEM = int(os.getenv('OCR_OEM', '3'))  # Tesseract OCR engine mode
+OCR_TARGET_DPI = int(os.getenv('OCR_TARGET_DPI', '300'))
+OCR_MAX_DIMENSION = int(os.getenv('OCR_MAX_DIMENSION', '4000'))  # Widest an image is upscaled to, in pixels
+OCR_BINARIZE = os.getenv('OCR_BINARIZE', 'False').lower() == 'true'
+OCR_TILE_HEIGHT = int(os.getenv('OCR_TILE_HEIGHT', '1600'))
+OCR_TILE_SEAM_SEARCH = int(os.getenv('OCR_TILE_SEAM_SEARCH', '120'))  # Rows above each tile's end searched for a blank row to cut at
+
+# OCR pages of scanned PDFs that have no text layer (uses OCR_WORKERS for the page pool)
+PDF_OCR_FALLBACK = os.getenv('PDF_OCR_FALLBACK', 'True').lower() == 'true'
+
 # Translation settings
 SUPPORTED_LANGUAGES = {
     'auto': 'Auto-detect',
@@ -46,3 +87,54 @@ SUPPORTED_LANGUAGES = {
 # Temporary directory for file processing
 TEMP_DIR = os.path.join(os.getcwd(), 'temp')
 os.makedirs(TEMP_DIR, exist_ok=True)
+
+# Per-job workspaces under TEMP_DIR (see workspace.py)
+WORKSPACE_DIR = os.path.join(TEMP_DIR, 'workspaces')
+os.makedirs(WORKSPACE_DIR, exist_ok=True)  # Also holds fallback temp files of the converter and translator
+WORKSPACE_TTL = int(os.getenv('WORKSPACE_TTL', str(2 * 60 * 60)))  # Seconds before an abandoned workspace is swept
+WORKSPACE_MAX_BYTES = int(os.getenv('WORKSPACE_MAX_BYTES', str(500 * 1024 * 1024)))  # Disk quota for all workspaces
+WORKSPACE_SWEEP_INTERVAL = int(os.getenv('WORKSPACE_SWEEP_INTERVAL', '300'))  # Seconds between sweeps
+WORKSPACE_WAIT_TIMEOUT = int(os.getenv('WORKSPACE_WAIT_TIMEOUT', '60'))  # Seconds a new job waits for quota
+
+# Bot process supervised by the web dashboard (see supervisor.py)
+BOT_HEARTBEAT_PATH = os.path.join(TEMP_DIR, 'bot.heartbeat')
+BOT_LOG_PATH = os.path.join(TEMP_DIR, 'bot.log')
+BOT_HEARTBEAT_INTERVAL = float(os.getenv('BOT_HEARTBEAT_INTERVAL', '5'))  # Seconds between heartbeats
+BOT_HEARTBEAT_TIMEOUT = float(os.getenv('BOT_HEARTBEAT_TIMEOUT', '30'))  # Silence before the bot is restarted
+BOT_READY_TIMEOUT = float(os.getenv('BOT_READY_TIMEOUT', '30'))  # Time allowed for the first heartbeat
+BOT_RESTART_BACKOFF_MAX = float(os.getenv('BOT_RESTART_BACKOFF_MAX', '60'))  # Cap on the doubling restart delay
+STATUS_REFRESH_INTERVAL = float(os.getenv('STATUS_REFRESH_INTERVAL', '2'))  # Seconds between dashboard status snapshots
+
+# Job metrics written by the bot and served by the dashboard (see metrics.py)
+METRICS_PATH = os.path.join(TEMP_DIR, 'bot_metrics.json')  # Rewritten on every bot heartbeat
+
+# Per-step tracing spans (see tracing.py); leave TRACE_LOG_PATH empty to send spans to the log instead
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False').lower() == 'true'
+TRACE_LOG_PATH = os.getenv('TRACE_LOG_PATH', os.path.join(TEMP_DIR, 'traces.jsonl'))  # One JSON object per span
+
+# On-demand cProfile runs of individual jobs (also requested from the dashboard)
+PROFILE_DIR = os.path.join(TEMP_DIR, 'profiles')
+PROFILE_NEXT_JOBS = int(os.getenv('PROFILE_NEXT_JOBS', '0'))  # Profile this many jobs; applied once per value, not on every restart
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '20'))  # Most recent profiles kept on disk
+PROFILE_SUMMARY_LINES = int(os.getenv('PROFILE_SUMMARY_LINES', '60'))  # Functions listed in the text summary
+
+# Updates already handled by a bot process, shared by all webhook workers on the host
+UPDATE_DEDUP_PATH = os.getenv('UPDATE_DEDUP_PATH', os.path.join(TEMP_DIR, 'processed_updates.sqlite3'))
+
+# Conversion cache (stored under TEMP_DIR)
+CONVERSION_CACHE_ENABLED = os.getenv('CONVERSION_CACHE_ENABLED', 'True').lower() == 'true'
+CONVERSION_CACHE_MAX_BYTES = int(os.getenv('CONVERSION_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Translation memory (SQLite database of previously translated segments)
+TRANSLATION_MEMORY_ENABLED = os.getenv('TRANSLATION_MEMORY_ENABLED', 'True').lower() == 'true'
+TRANSLATION_MEMORY_PATH = os.getenv('TRANSLATION_MEMORY_PATH', os.path.join(TEMP_DIR, 'translation_memory.sqlite3'))
+
+# Concurrent chunk translation
+TRANSLATION_CONCURRENCY = int(os.getenv('TRANSLATION_CONCURRENCY', '4'))  # Requests in flight per document
+TRANSLATION_MAX_RETRIES = int(os.getenv('TRANSLATION_MAX_RETRIES', '3'))  # Retries per chunk
+TRANSLATION_RETRY_BACKOFF = float(os.getenv('TRANSLATION_RETRY_BACKOFF', '1.0'))  # Seconds, doubled per retry
+
+# Translation service (see translation_backends.py); 'fake' is an offline stand-in for testing and benchmarks
+TRANSLATION_BACKEND = os.getenv('TRANSLATION_BACKEND', 'google')
+FAKE_TRANSLATOR_LATENCY = float(os.getenv('FAKE_TRANSLATOR_LATENCY', '0.05'))  # Seconds per request
+FAKE_TRANSLATOR_RATE_LIMIT = float(os.getenv('FAKE_TRANSLATOR_RATE_LIMIT', '0'))  # Requests/sec, 0 = unlimited
@@ -0,0 +1,169 @@
+"""
+Content-addressed disk cache for extracted text and converted documents
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+import metrics
+from config import TEMP_DIR, CONVERSION_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def hash_file(file_path: str) -> str:
+    """Return the SHA-256 of a file, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_source(source) -> str:
+    """Return the SHA-256 of a file path, bytes or binary file object"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+    if hasattr(source, 'read'):
+        digest = hashlib.sha256()
+        source.seek(0)
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+        source.seek(0)
+        return digest.hexdigest()
+    return hash_file(source)
+
+class ConversionCache:
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        self.cache_dir = cache_dir or os.path.join(TEMP_DIR, 'conversion_cache')
+        self.max_bytes = CONVERSION_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._evict_lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def make_key(self, source, variant: str, file_unique_id: str = None) -> str:
+        """Build a cache key from the file content (or Telegram file_unique_id) and a variant tag"""
+        identity = f'tg:{file_unique_id}' if file_unique_id else f'sha256:{hash_source(source)}'
+        return hashlib.sha256(f'{identity}|{variant}'.encode('utf-8')).hexdigest()
+    
+    def sub_key(self, key: str, tag: str) -> str:
+        """Derive a key for an output that depends on more than the input file"""
+        return hashlib.sha256(f'{key}|{tag}'.encode('utf-8')).hexdigest()
+    
+    def get_text(self, key: str):
+        """Return cached text for a key, or None"""
+        path = self._hit(f'{key}.txt')
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return file.read()
+        except OSError:
+            return None
+    
+    def put_text(self, key: str, text: str):
+        """Store text for a key"""
+        try:
+            with self.text_writer(key) as file:
+                file.write(text)
+        except OSError as e:
+            logger.error(f"Error writing cache entry {key}.txt: {e}")
+    
+    @contextmanager
+    def text_writer(self, key: str):
+        """Stream text into the cache; the entry is only published if the block completes"""
+        with self._atomic_entry(f'{key}.txt') as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                yield file
+    
+    def get_bytes(self, key: str, suffix: str):
+        """Return the contents of a cached file, or None"""
+        entry_name = f'{key}{suffix}'
+        path = self._hit(entry_name)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as cached_file:
+                return cached_file.read()
+        except OSError:
+            return None
+    
+    def put_bytes(self, key: str, data: bytes, suffix: str):
+        """Store file contents for a key"""
+        try:
+            with self._atomic_entry(f'{key}{suffix}') as temp_path:
+                with open(temp_path, 'wb') as file:
+                    file.write(data)
+        except OSError as e:
+            logger.error(f"Error writing cache entry {key}{suffix}: {e}")
+    
+    def put_file(self, key: str, file_path: str, suffix: str):
+        """Store a copy of a file for a key"""
+        try:
+            with self._atomic_entry(f'{key}{suffix}') as temp_path:
+                shutil.copyfile(file_path, temp_path)
+        except OSError as e:
+            logger.error(f"Error writing cache entry for {file_path}: {e}")
+    
+    def _hit(self, entry_name: str):
+        """Mark an entry as recently used and return its path, or None on a miss"""
+        path = os.path.join(self.cache_dir, entry_name)
+        # Text and document lookups are counted separately: one conversion can do both
+        suffix = os.path.splitext(entry_name)[1]
+        series = 'conversion_cache_text' if suffix == '.txt' else f"conversion_cache_{suffix.lstrip('.')}"
+        try:
+            # The directory is the index, so entries written by other processes are found too;
+            # touching mtime keeps the LRU order shared between them
+            os.utime(path)
+        except OSError:
+            metrics.count(f'{series}_misses')
+            return None
+        metrics.count(f'{series}_hits')
+        return path
+    
+    @contextmanager
+    def _atomic_entry(self, entry_name: str):
+        """Yield a temporary path and publish it under entry_name once the block succeeds"""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        os.close(fd)
+        try:
+            yield temp_path
+            os.replace(temp_path, os.path.join(self.cache_dir, entry_name))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._evict()
+    
+    def _evict(self):
+        """Drop least recently used entries until the directory fits in max_bytes
+        
+        Scans the directory rather than trusting an in-process view, so the cap holds for
+        the cache as a whole when several processes share it.
+        """
+        with self._evict_lock:
+            entries = []
+            total_bytes = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another process mid-scan
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+                total_bytes += stat.st_size
+            for _, entry_name, size in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    return
+                try:
+                    os.remove(os.path.join(self.cache_dir, entry_name))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"Error evicting cache entry {entry_name}: {e}")
+                    continue
+                total_bytes -= size
@@ -0,0 +1,154 @@
+"""
+Streaming DOCX writer for plain-text documents
+
+Builds the WordprocessingML package directly instead of going through python-docx's
+object model, writing paragraphs to the zip stream as they arrive. Only paragraph
+text and a few named styles are supported; anything richer should use python-docx.
+"""
+
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Characters XML 1.0 does not allow; python-docx rejects them, here they are dropped
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# Paragraph XML is joined and written in batches of this many paragraphs
+FLUSH_EVERY = 512
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+
+_PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Style ids match python-docx's default template, with a similar look
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:docDefaults>'
+    '<w:rPrDefault><w:rPr><w:rFonts w:asciiTheme="minorHAnsi" w:hAnsiTheme="minorHAnsi" '
+    'w:eastAsiaTheme="minorEastAsia" w:cstheme="minorBidi"/><w:sz w:val="22"/><w:szCs w:val="22"/>'
+    '<w:lang w:val="en-US"/></w:rPr></w:rPrDefault>'
+    '<w:pPrDefault><w:pPr><w:spacing w:after="200" w:line="276" w:lineRule="auto"/></w:pPr></w:pPrDefault>'
+    '</w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>'
+    '<w:next w:val="Normal"/><w:qFormat/>'
+    '<w:pPr><w:pBdr><w:bottom w:val="single" w:sz="8" w:space="4" w:color="4F81BD"/></w:pBdr>'
+    '<w:spacing w:after="300" w:line="240" w:lineRule="auto"/><w:contextualSpacing/></w:pPr>'
+    '<w:rPr><w:color w:val="17365D"/><w:spacing w:val="5"/><w:kern w:val="28"/>'
+    '<w:sz w:val="52"/><w:szCs w:val="52"/></w:rPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Subtitle"><w:name w:val="Subtitle"/><w:basedOn w:val="Normal"/>'
+    '<w:next w:val="Normal"/><w:qFormat/>'
+    '<w:rPr><w:i/><w:iCs/><w:color w:val="4F81BD"/><w:spacing w:val="15"/>'
+    '<w:sz w:val="24"/><w:szCs w:val="24"/></w:rPr></w:style>'
+    '</w:styles>'
+)
+
+_DOCUMENT_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+
+# US Letter with 1" margins, matching python-docx's default section
+_DOCUMENT_END = (
+    '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+    '<w:pgMar w:top="1440" w:right="1800" w:bottom="1440" w:left="1800" '
+    'w:header="720" w:footer="720" w:gutter="0"/></w:sectPr>'
+    '</w:body></w:document>'
+)
+
+def iter_paragraphs(text: str):
+    """Yield the non-empty, stripped lines of text; each becomes one paragraph"""
+    for line in text.split('\n'):
+        line = line.strip()
+        if line:
+            yield line
+
+def _paragraph_xml(text: str, style: str = None) -> str:
+    text = escape(_INVALID_XML_CHARS.sub('', text))
+    style_xml = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{style_xml}<w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+
+class DocxWriter:
+    """Write a plain-text DOCX to a path or binary stream, one paragraph at a time.
+    
+    Use as a context manager; the package is only complete once the block exits.
+    """
+    
+    def __init__(self, output):
+        self._zip = zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        self._zip.writestr('_rels/.rels', _PACKAGE_RELS)
+        self._zip.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS)
+        self._zip.writestr('word/styles.xml', _STYLES)
+        # document.xml is written last so its body can stream straight into the archive
+        self._document = self._zip.open('word/document.xml', 'w', force_zip64=True)
+        self._document.write(_DOCUMENT_START.encode('utf-8'))
+        self._buffer = []
+    
+    def add_paragraph(self, text: str, style: str = None):
+        self._buffer.append(_paragraph_xml(text, style))
+        if len(self._buffer) >= FLUSH_EVERY:
+            self._flush()
+    
+    def add_paragraphs(self, texts, style: str = None):
+        for text in texts:
+            self.add_paragraph(text, style)
+    
+    def close(self):
+        """Finish the document and the zip archive"""
+        if self._document is None:
+            return
+        self._flush()
+        self._document.write(_DOCUMENT_END.encode('utf-8'))
+        self._document.close()
+        self._document = None
+        self._zip.close()
+    
+    def abort(self):
+        """Close the archive without finishing the document (used after an error)"""
+        if self._document is not None:
+            self._document.close()
+            self._document = None
+        self._zip.close()
+    
+    def _flush(self):
+        if self._buffer:
+            self._document.write(''.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
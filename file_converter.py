@@ -3,88 +3,411 @@ File conversion utilities for converting various file formats to DOCX
 """
 
 import logging
+import math
+import mmap
 import os
+import shutil
 import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from docx import Document
 from docx.shared import Inches
 import PyPDF2
-import pytesseract
 from PIL import Image
 import io
 import zipfile
 import xml.etree.ElementTree as ET
+import metrics
+import tracing
 from utils import cleanup_file, get_file_extension
+from config import (
+    PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_OCR_FALLBACK, OCR_TARGET_DPI, CONVERSION_CACHE_ENABLED,
+    DOCX_FAST_WRITER, WORKSPACE_DIR
+)
+from conversion_cache import ConversionCache
+from docx_writer import DocxWriter, iter_paragraphs
+from ocr_engine import OCREngine
+
+try:
+    from pdf2image import convert_from_path, convert_from_bytes
+except ImportError:
+    # Without poppler/pdf2image, scanned pages are OCR'd from their embedded images
+    convert_from_path = convert_from_bytes = None
 
 logger = logging.getLogger(__name__)
 
+# Part of every cache key; bump when extraction output changes so stale cached text is ignored
+EXTRACTOR_VERSION = 1
+
+def _is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+@contextmanager
+def _open_binary(source, use_mmap: bool = False):
+    """Open a path, bytes or binary file object as a readable binary stream.
+    
+    With use_mmap, files on disk are memory-mapped instead of read through a buffer.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    elif not _is_path(source):
+        source.seek(0)
+        yield source
+    elif use_mmap and os.path.getsize(source) > 0:
+        with open(source, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    else:
+        with open(source, 'rb') as file:
+            yield file
+
+def _read_bytes(source) -> bytes:
+    with _open_binary(source) as stream:
+        return stream.read()
+
+def _spill_to_file(source, suffix: str) -> str:
+    """Copy in-memory content to a temporary file once, so worker processes can open it by path"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=WORKSPACE_DIR) as temp_file:
+        try:
+            with _open_binary(source) as stream:
+                shutil.copyfileobj(stream, temp_file)
+        except BaseException:
+            temp_file.close()
+            cleanup_file(temp_file.name)
+            raise
+        return temp_file.name
+
+def _extract_pdf_page_range(source, start: int, stop: int) -> list:
+    """Extract text from pages [start, stop) of a PDF (runs in a worker process)"""
+    with _open_binary(source, use_mmap=True) as stream:
+        pdf_reader = PyPDF2.PdfReader(stream)
+        return [pdf_reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+def _rasterize_pdf_page(source, page_index: int) -> list:
+    """Return the images to OCR for a PDF page"""
+    if convert_from_path is not None:
+        options = {'dpi': OCR_TARGET_DPI, 'first_page': page_index + 1, 'last_page': page_index + 1}
+        if _is_path(source):
+            return convert_from_path(source, **options)
+        return convert_from_bytes(_read_bytes(source), **options)
+    
+    with _open_binary(source, use_mmap=True) as stream:
+        page = PyPDF2.PdfReader(stream).pages[page_index]
+        return [Image.open(io.BytesIO(image_file.data)) for image_file in page.images]
+
+def _ocr_pdf_page(source, page_index: int, ocr_engine: OCREngine = None) -> str:
+    """Rasterize and OCR a single PDF page (runs in a worker process unless an engine is given)"""
+    # Workers already run one page each, so they must not start a nested tile pool
+    ocr_engine = ocr_engine or OCREngine(workers=0)
+    try:
+        images = _rasterize_pdf_page(source, page_index)
+        return "\n".join(ocr_engine.image_to_string(image) for image in images)
+    except Exception as e:
+        logger.error(f"Error running OCR on PDF page {page_index + 1}: {e}")
+        return ""
+
+class ExtractedDocument:
+    """Text extracted from an upload, shared by conversion and translation"""
+    
+    def __init__(self, text: str, original_filename: str, source_format: str, cache_key: str = None):
+        self.text = text
+        self.original_filename = original_filename
+        self.source_format = source_format
+        self.cache_key = cache_key
+    
+    @property
+    def paragraphs(self) -> list:
+        """Non-empty lines of the text, as they appear in the generated DOCX"""
+        return [line.strip() for line in self.text.split('\n') if line.strip()]
+
 class FileConverter:
-    def __init__(self):
+    """Extractors take a source that is a file path, the file's bytes or a binary file object"""
+    
+    def __init__(self, pdf_workers: int = None, pdf_ocr_fallback: bool = None):
         self.supported_formats = ['.txt', '.pdf', '.doc', '.docx', '.rtf', '.odt', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
+        self.pdf_workers = PDF_EXTRACT_WORKERS if pdf_workers is None else pdf_workers
+        self.pdf_ocr_fallback = PDF_OCR_FALLBACK if pdf_ocr_fallback is None else pdf_ocr_fallback
+        self.ocr_engine = OCREngine()
+        self.cache = ConversionCache() if CONVERSION_CACHE_ENABLED else None
+    
+    def extract(self, file_path, original_filename: str, file_unique_id: str = None) -> ExtractedDocument:
+        """Extract text from any supported file into a reusable ExtractedDocument"""
+        with tracing.span('detect_format') as detect_span:
+            file_extension = get_file_extension(original_filename).lower()
+            detect_span.set(format=file_extension)
+            
+            if file_extension not in self.supported_formats:
+                raise ValueError(f"Unsupported file format: {file_extension}")
+        
+        with tracing.span('extract', format=file_extension) as extract_span:
+            cache_key = self._cache_key(file_path, file_extension, file_unique_id)
+            text_content = self.cache.get_text(cache_key) if cache_key else None
+            extract_span.set(cached=text_content is not None)
+            if text_content is None:
+                text_content = self._extract_text(file_path, file_extension)
+                if cache_key:
+                    self.cache.put_text(cache_key, text_content)
+            extract_span.set(characters=len(text_content))
+        
+        return ExtractedDocument(text_content, original_filename, file_extension, cache_key)
     
-    def convert_to_docx(self, file_path: str, original_filename: str) -> str:
+    def convert_to_docx(self, file_path, original_filename: str, file_unique_id: str = None,
+                        extracted: ExtractedDocument = None) -> str:
         """Convert any supported file to DOCX format"""
         try:
+            if extracted is not None:
+                return self.convert_extracted_to_docx(extracted)
+            
             file_extension = get_file_extension(original_filename).lower()
             
             if file_extension not in self.supported_formats:
                 raise ValueError(f"Unsupported file format: {file_extension}")
             
-            # Extract text based on file type
-            if file_extension == '.txt':
-                text_content = self._extract_from_txt(file_path)
-            elif file_extension == '.pdf':
-                text_content = self._extract_from_pdf(file_path)
-            elif file_extension in ['.doc', '.docx']:
-                text_content = self._extract_from_word(file_path)
-            elif file_extension == '.rtf':
-                text_content = self._extract_from_rtf(file_path)
-            elif file_extension == '.odt':
-                text_content = self._extract_from_odt(file_path)
-            elif file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']:
-                text_content = self._extract_from_image(file_path)
-            else:
-                raise ValueError(f"Conversion not implemented for {file_extension}")
-            
-            # Create DOCX file
-            output_path = self._create_docx(text_content, original_filename)
-            return output_path
+            # Serve repeat uploads from the conversion cache
+            cache_key = self._cache_key(file_path, file_extension, file_unique_id)
+            if cache_key:
+                text_content = self.cache.get_text(cache_key)
+                if text_content is not None:
+                    return self.convert_extracted_to_docx(
+                        ExtractedDocument(text_content, original_filename, file_extension, cache_key)
+                    )
+            
+            if file_extension == '.pdf':
+                # Stream pages straight into the document instead of
+                # materialising the whole PDF text first
+                pages = self._iter_pdf_pages(file_path)
+                if cache_key:
+                    pages = self._tee_pages_to_cache(pages, cache_key)
+                output_path = self._create_docx_from_pages(pages, original_filename)
+                if cache_key:
+                    self.cache.put_file(self.cache.sub_key(cache_key, original_filename), output_path, '.docx')
+                return output_path
+            
+            text_content = self._extract_text(file_path, file_extension)
+            if cache_key:
+                self.cache.put_text(cache_key, text_content)
+            
+            return self.convert_extracted_to_docx(
+                ExtractedDocument(text_content, original_filename, file_extension, cache_key)
+            )
             
         except Exception as e:
             logger.error(f"Error converting file {original_filename}: {e}")
             raise
     
-    def _extract_from_txt(self, file_path: str) -> str:
+    def convert_extracted_to_docx(self, extracted: ExtractedDocument) -> str:
+        """Create a DOCX file from an already extracted document"""
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx', dir=WORKSPACE_DIR) as temp_file:
+            temp_file.write(self.render_docx(extracted))
+            return temp_file.name
+    
+    def render_docx(self, extracted: ExtractedDocument) -> bytes:
+        """Build the DOCX for an extracted document in memory and return its bytes"""
+        docx_key = None
+        if self.cache is not None and extracted.cache_key:
+            docx_key = self.cache.sub_key(extracted.cache_key, extracted.original_filename)
+            cached_output = self.cache.get_bytes(docx_key, '.docx')
+            if cached_output is not None:
+                return cached_output
+        
+        # Create DOCX file
+        output = io.BytesIO()
+        self._create_docx(extracted.text, extracted.original_filename, output=output)
+        docx_bytes = output.getvalue()
+        if docx_key:
+            self.cache.put_bytes(docx_key, docx_bytes, '.docx')
+        return docx_bytes
+    
+    def convert_pdf_streaming(self, file_path, original_filename: str, file_unique_id: str = None):
+        """Extract a PDF and write its DOCX in one pass; returns (docx_bytes, extracted).
+        
+        Pages go into the streaming writer as extraction yields them, so the document is
+        never built from the materialised text. Cached text is rendered as usual.
+        """
+        with tracing.span('extract', format='.pdf', streamed=True) as extract_span:
+            cache_key = self._cache_key(file_path, '.pdf', file_unique_id)
+            text_content = self.cache.get_text(cache_key) if cache_key else None
+            extract_span.set(cached=text_content is not None)
+            if text_content is not None:
+                extracted = ExtractedDocument(text_content, original_filename, '.pdf', cache_key)
+                with metrics.timed('docx'):
+                    return self.render_docx(extracted), extracted
+            
+            page_texts = []
+            extract_seconds = 0.0
+            
+            def collected_pages(pages):
+                # Time only the pulls, so extraction and DOCX writing still report separately
+                nonlocal extract_seconds
+                pages = iter(pages)
+                while True:
+                    started = time.perf_counter()
+                    page_text = next(pages, None)
+                    extract_seconds += time.perf_counter() - started
+                    if page_text is None:
+                        return
+                    page_texts.append(page_text)
+                    yield page_text
+            
+            pages = self._iter_pdf_pages(file_path)
+            if cache_key:
+                pages = self._tee_pages_to_cache(pages, cache_key)
+            output = io.BytesIO()
+            started = time.perf_counter()
+            self._create_docx_from_pages(collected_pages(pages), original_filename, output)
+            metrics.add_stage_time('extract', extract_seconds)
+            metrics.add_stage_time('docx', time.perf_counter() - started - extract_seconds)
+            
+            # Same layout as _extract_from_pdf, so the result matches a separate extract()
+            extracted = ExtractedDocument("".join(page_text + "\n" for page_text in page_texts),
+                                          original_filename, '.pdf', cache_key)
+            extract_span.set(characters=len(extracted.text))
+            docx_bytes = output.getvalue()
+            if cache_key:
+                self.cache.put_bytes(self.cache.sub_key(cache_key, original_filename), docx_bytes, '.docx')
+            return docx_bytes, extracted
+    
+    def _extract_text(self, file_path, file_extension: str) -> str:
+        """Extract text based on file type"""
+        if file_extension == '.txt':
+            return self._extract_from_txt(file_path)
+        elif file_extension == '.pdf':
+            return self._extract_from_pdf(file_path)
+        elif file_extension in ['.doc', '.docx']:
+            return self._extract_from_word(file_path)
+        elif file_extension == '.rtf':
+            return self._extract_from_rtf(file_path)
+        elif file_extension == '.odt':
+            return self._extract_from_odt(file_path)
+        elif file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']:
+            return self._extract_from_image(file_path)
+        else:
+            raise ValueError(f"Conversion not implemented for {file_extension}")
+    
+    def _cache_key(self, file_path, file_extension: str, file_unique_id: str = None):
+        """Return the cache key for a file's extracted text, or None when caching is off"""
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.make_key(file_path, f'{file_extension}|{EXTRACTOR_VERSION}', file_unique_id)
+        except OSError as e:
+            logger.error(f"Error hashing upload for the conversion cache: {e}")
+            return None
+    
+    def _tee_pages_to_cache(self, pages, cache_key: str):
+        """Pass pages through unchanged while streaming their text into the cache"""
+        with self.cache.text_writer(cache_key) as cache_file:
+            for page_text in pages:
+                # Same layout as _extract_from_pdf so both paths share cache entries
+                cache_file.write(page_text + "\n")
+                yield page_text
+    
+    @tracing.traced()
+    def _extract_from_txt(self, file_path) -> str:
         """Extract text from TXT file"""
+        content = _read_bytes(file_path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            return content.decode('utf-8')
         except UnicodeDecodeError:
             # Try with different encoding
-            with open(file_path, 'r', encoding='latin-1') as file:
-                return file.read()
+            return content.decode('latin-1')
     
-    def _extract_from_pdf(self, file_path: str) -> str:
+    @tracing.traced()
+    def _extract_from_pdf(self, file_path) -> str:
         """Extract text from PDF file"""
-        text_content = ""
+        return "".join(page_text + "\n" for page_text in self._iter_pdf_pages(file_path))
+    
+    def _iter_pdf_pages(self, file_path):
+        """Yield extracted text from a PDF file one page at a time"""
+        has_text = False
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text() + "\n"
+            for page_text in self._iter_with_ocr_fallback(file_path, self._iter_pdf_page_texts(file_path)):
+                has_text = has_text or bool(page_text.strip())
+                yield page_text
         except Exception as e:
             logger.error(f"Error extracting from PDF: {e}")
             raise ValueError("Failed to extract text from PDF")
         
-        if not text_content.strip():
+        if not has_text:
             raise ValueError("No text found in PDF")
+    
+    def _iter_with_ocr_fallback(self, file_path, page_texts):
+        """Replace pages that have no text layer with OCR output, keeping page order"""
+        if not self.pdf_ocr_fallback:
+            yield from page_texts
+            return
         
-        return text_content
+        # Pages are str once known, or a Future while their OCR is still running
+        pending = deque()
+        executor = None
+        worker_source = file_path
+        try:
+            for page_index, page_text in enumerate(page_texts):
+                if page_text.strip():
+                    pending.append(page_text)
+                elif self.ocr_engine.workers > 1:
+                    if executor is None:
+                        executor = ProcessPoolExecutor(max_workers=self.ocr_engine.workers)
+                        if not _is_path(file_path):
+                            # Workers reopen the PDF by path; pickling an in-memory one would copy it per page
+                            worker_source = _spill_to_file(file_path, '.pdf')
+                    pending.append(executor.submit(_ocr_pdf_page, worker_source, page_index))
+                else:
+                    pending.append(_ocr_pdf_page(file_path, page_index, self.ocr_engine))
+                
+                while pending and (isinstance(pending[0], str) or pending[0].done()):
+                    head = pending.popleft()
+                    yield head if isinstance(head, str) else head.result()
+            
+            while pending:
+                head = pending.popleft()
+                yield head if isinstance(head, str) else head.result()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            if worker_source is not file_path:
+                cleanup_file(worker_source)
     
-    def _extract_from_word(self, file_path: str) -> str:
+    def _iter_pdf_page_texts(self, file_path):
+        """Yield raw page texts, using the process pool for large documents on disk when enabled"""
+        with _open_binary(file_path, use_mmap=True) as stream:
+            pdf_reader = PyPDF2.PdfReader(stream)
+            page_count = len(pdf_reader.pages)
+            # Workers reopen the file by path; in-memory PDFs would have to be copied to every worker
+            if self.pdf_workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES or not _is_path(file_path):
+                for page in pdf_reader.pages:
+                    yield page.extract_text() or ""
+                return
+        
+        yield from self._iter_pdf_pages_parallel(file_path, page_count)
+    
+    def _iter_pdf_pages_parallel(self, file_path: str, page_count: int):
+        """Extract page ranges in worker processes and yield the pages back in order"""
+        workers = min(self.pdf_workers, page_count)
+        # Several ranges per worker keeps every core busy when page costs are uneven
+        range_size = max(1, math.ceil(page_count / (workers * 4)))
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_extract_pdf_page_range, file_path, start, min(start + range_size, page_count))
+                for start in range(0, page_count, range_size)
+            ]
+            try:
+                for future in futures:
+                    yield from future.result()
+            finally:
+                # Don't keep extracting if the consumer stopped early or a range failed
+                for future in futures:
+                    future.cancel()
+    
+    @tracing.traced()
+    def _extract_from_word(self, file_path) -> str:
         """Extract text from Word document"""
         try:
-            doc = Document(file_path)
+            doc = Document(file_path if _is_path(file_path) else io.BytesIO(_read_bytes(file_path)))
             text_content = ""
             for paragraph in doc.paragraphs:
                 text_content += paragraph.text + "\n"
@@ -93,12 +416,12 @@ class FileConverter:
             logger.error(f"Error extracting from Word document: {e}")
             raise ValueError("Failed to extract text from Word document")
     
-    def _extract_from_rtf(self, file_path: str) -> str:
+    @tracing.traced()
+    def _extract_from_rtf(self, file_path) -> str:
         """Extract text from RTF file"""
         try:
             # Simple RTF text extraction (basic implementation)
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
+            content = _read_bytes(file_path).decode('utf-8')
             
             # Remove RTF control sequences (basic cleanup)
             import re
@@ -114,11 +437,12 @@ class FileConverter:
             logger.error(f"Error extracting from RTF: {e}")
             raise ValueError("Failed to extract text from RTF file")
     
-    def _extract_from_odt(self, file_path: str) -> str:
+    @tracing.traced()
+    def _extract_from_odt(self, file_path) -> str:
         """Extract text from ODT file"""
         try:
             text_content = ""
-            with zipfile.ZipFile(file_path, 'r') as odt_file:
+            with _open_binary(file_path) as stream, zipfile.ZipFile(stream, 'r') as odt_file:
                 content_xml = odt_file.read('content.xml')
                 root = ET.fromstring(content_xml)
                 
@@ -134,12 +458,13 @@ class FileConverter:
             logger.error(f"Error extracting from ODT: {e}")
             raise ValueError("Failed to extract text from ODT file")
     
-    def _extract_from_image(self, file_path: str) -> str:
+    @tracing.traced()
+    def _extract_from_image(self, file_path) -> str:
         """Extract text from image using OCR"""
         try:
             # Open image and perform OCR
-            image = Image.open(file_path)
-            text_content = pytesseract.image_to_string(image)
+            with _open_binary(file_path) as stream, Image.open(stream) as image:
+                text_content = self.ocr_engine.image_to_string(image)
             
             if not text_content.strip():
                 raise ValueError("No text found in image")
@@ -149,26 +474,62 @@ class FileConverter:
             logger.error(f"Error extracting text from image: {e}")
             raise ValueError("Failed to extract text from image. Make sure the image contains readable text.")
     
-    def _create_docx(self, text_content: str, original_filename: str) -> str:
+    def _create_docx(self, text_content: str, original_filename: str, output=None):
         """Create a DOCX file from text content"""
+        return self._create_docx_from_pages([text_content], original_filename, output)
+    
+    @tracing.traced('docx')
+    def _create_docx_from_pages(self, pages, original_filename: str, output=None):
+        """Create a DOCX file from an iterable of page texts, consuming pages as they arrive.
+        
+        Saves into output (a path or binary stream) when given; otherwise into a new
+        temporary file whose path is returned.
+        """
         try:
+            if DOCX_FAST_WRITER:
+                return self._write_plain_docx(pages, original_filename, output)
+            
             # Create new document
             doc = Document()
             
             # Add title
-            title = doc.add_heading(f'Converted from {original_filename}', 0)
+            doc.add_heading(f'Converted from {original_filename}', 0)
             
-            # Add content
-            paragraphs = text_content.split('\n')
-            for paragraph_text in paragraphs:
-                if paragraph_text.strip():
-                    doc.add_paragraph(paragraph_text.strip())
+            # Add content page by page so only the current page is held as a string
+            for page_text in pages:
+                for paragraph_text in iter_paragraphs(page_text):
+                    doc.add_paragraph(paragraph_text)
+            
+            if output is not None:
+                doc.save(output)
+                return output
             
             # Save to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx', dir=WORKSPACE_DIR) as temp_file:
                 doc.save(temp_file.name)
                 return temp_file.name
-                
+        
+        except ValueError:
+            # Extraction errors raised by the page source already carry a user-facing message
+            raise
         except Exception as e:
             logger.error(f"Error creating DOCX: {e}")
             raise ValueError("Failed to create DOCX file")
+    
+    def _write_plain_docx(self, pages, original_filename: str, output=None):
+        """Stream page texts into a DOCX with DocxWriter, bypassing python-docx's object model"""
+        if output is None:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx', dir=WORKSPACE_DIR) as temp_file:
+                try:
+                    self._write_plain_docx(pages, original_filename, temp_file)
+                except BaseException:
+                    temp_file.close()
+                    cleanup_file(temp_file.name)
+                    raise
+                return temp_file.name
+        
+        with DocxWriter(output) as writer:
+            writer.add_paragraph(f'Converted from {original_filename}', style='Title')
+            for page_text in pages:
+                writer.add_paragraphs(iter_paragraphs(page_text))
+        return output
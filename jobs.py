@@ -0,0 +1,313 @@
+"""
+Background job queue that runs conversions and translations in worker processes
+"""
+
+import asyncio
+import cProfile
+import heapq
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import pstats
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+import tracing
+from utils import get_file_extension
+from config import JOB_WORKERS, JOB_PER_USER_LIMIT, PROFILE_DIR, PROFILE_NEXT_JOBS, PROFILE_KEEP, PROFILE_SUMMARY_LINES
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers run first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+# The bot process runs threads (event loop, callbacks, sweeper) and holds database connections,
+# so workers start from a clean forkserver process instead of a fork of it
+_MP_CONTEXT = multiprocessing.get_context('forkserver')
+
+# Converter and translator owned by each worker process, created on first use; conversions
+# never build the translator, so a translation backend that fails to start can't break them
+_worker_converter = None
+_worker_translator = None
+
+def _get_worker_converter():
+    global _worker_converter
+    if _worker_converter is None:
+        from file_converter import FileConverter
+        _worker_converter = FileConverter()
+    return _worker_converter
+
+def _get_worker_translator():
+    global _worker_translator
+    if _worker_translator is None:
+        from translator import Translator
+        _worker_translator = Translator(file_converter=_get_worker_converter())
+    return _worker_translator
+
+def run_conversion(source, original_filename: str, file_unique_id: str = None, extracted=None, trace=None):
+    """Convert an upload (path or bytes) to DOCX in a worker process.
+    
+    Returns (docx_bytes, extracted, job_metrics), job_metrics being the stage timings and
+    counters this job recorded (see metrics.take_job_metrics). trace is the bot's
+    tracing.new_trace() value, so spans recorded here join the job's trace.
+    """
+    # Discard anything a failed job left behind in this worker
+    metrics.take_job_metrics()
+    with tracing.span('conversion_job', parent=trace, reused_extraction=extracted is not None):
+        file_converter = _get_worker_converter()
+        if extracted is None and get_file_extension(original_filename).lower() == '.pdf':
+            docx_bytes, extracted = file_converter.convert_pdf_streaming(source, original_filename, file_unique_id)
+            return docx_bytes, extracted, metrics.take_job_metrics()
+        if extracted is None:
+            with metrics.timed('extract'):
+                extracted = file_converter.extract(source, original_filename, file_unique_id)
+        with metrics.timed('docx'):
+            docx_bytes = file_converter.render_docx(extracted)
+    return docx_bytes, extracted, metrics.take_job_metrics()
+
+def run_translation(source, target_lang: str, original_filename: str, file_unique_id: str = None,
+                    extracted=None, trace=None):
+    """Translate an upload (path or bytes) to DOCX in a worker process; returns (docx_bytes, extracted, job_metrics)"""
+    metrics.take_job_metrics()
+    with tracing.span('translation_job', parent=trace, target_lang=target_lang, reused_extraction=extracted is not None):
+        translator = _get_worker_translator()
+        if extracted is None:
+            with metrics.timed('extract'):
+                extracted = translator.file_converter.extract(source, original_filename, file_unique_id)
+        output = io.BytesIO()
+        translator.translate_file(source, target_lang, original_filename, extracted=extracted, output=output)
+    return output.getvalue(), extracted, metrics.take_job_metrics()
+
+def profile_summary_path(profile_path: str) -> str:
+    return os.path.splitext(profile_path)[0] + '.txt'
+
+def run_profiled(profile_path: str, func, *args):
+    """Run a job function under cProfile in the worker, saving the raw stats and a text summary.
+    
+    Only the worker's main thread is profiled; time spent in translation pool threads or
+    in PDF/OCR helper processes shows up as time waiting on them.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(profile_path)
+        with open(profile_summary_path(profile_path), 'w') as summary_file:
+            stats = pstats.Stats(profiler, stream=summary_file)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_SUMMARY_LINES)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(PROFILE_SUMMARY_LINES)
+
+class Job:
+    def __init__(self, kind: str, user_id, func, args: tuple, priority: int = PRIORITY_NORMAL,
+                 on_complete=None, context: dict = None):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.on_complete = on_complete  # Called with the job once result or error is set
+        self.context = context or {}  # Caller data needed to deliver the result
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.profile_path = None  # Set when this job was picked to run under the profiler
+
+class JobScheduler:
+    def __init__(self, workers: int = None, per_user_limit: int = None, store=None):
+        self.workers = workers or JOB_WORKERS
+        self.store = store  # Optional storage.Store that keeps a record of every job
+        self.per_user_limit = per_user_limit or JOB_PER_USER_LIMIT
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_MP_CONTEXT)
+        # Result delivery does network I/O, so keep it off the executor's management thread
+        self._callback_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-callback')
+        self._lock = threading.Lock()
+        self._pending = []  # Heap of (priority, sequence, job)
+        self._sequence = itertools.count()
+        self._running = 0
+        self._running_by_user = {}
+        if self.store is not None:
+            self._apply_profiling_env_request()
+    
+    def submit(self, job: Job) -> int:
+        """Queue a job and return how many jobs are now waiting, including this one"""
+        if self._claim_profiling():
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            job.profile_path = os.path.join(PROFILE_DIR, f'{job.job_id}.prof')
+        self._save_job(job, new=True)
+        with self._lock:
+            heapq.heappush(self._pending, (job.priority, next(self._sequence), job))
+            position = len(self._pending)
+        self._dispatch()
+        return position
+    
+    async def submit_async(self, job: Job):
+        """Queue a job from asyncio code; returns (queue position, future resolving to the finished job)"""
+        loop = asyncio.get_running_loop()
+        completion = loop.create_future()
+        
+        def resolve(finished_job):
+            # Runs on a callback thread, so hand the job back to the event loop
+            loop.call_soon_threadsafe(lambda: completion.done() or completion.set_result(finished_job))
+        
+        job.on_complete = resolve
+        # submit() writes job records and claims profiling slots in the store, so keep it off the event loop
+        position = await asyncio.to_thread(self.submit, job)
+        return position, completion
+    
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+    
+    def running_count(self) -> int:
+        with self._lock:
+            return self._running
+    
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work; queued jobs that have not started are dropped"""
+        with self._lock:
+            self._pending.clear()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._callback_executor.shutdown(wait=wait)
+    
+    def _dispatch(self):
+        """Start queued jobs while there are free workers, skipping users at their concurrency cap"""
+        started = []
+        failed = []
+        with self._lock:
+            deferred = []
+            while self._pending and self._running < self.workers:
+                entry = heapq.heappop(self._pending)
+                job = entry[2]
+                if self._running_by_user.get(job.user_id, 0) >= self.per_user_limit:
+                    deferred.append(entry)
+                    continue
+                future = self._start(job)
+                if future is None:
+                    failed.append(job)
+                else:
+                    started.append((job, future))
+            for entry in deferred:
+                heapq.heappush(self._pending, entry)
+        
+        # Job records are written after releasing the lock, which the event loop takes to read queue gauges
+        for job, future in started:
+            self._save_job(job)
+            # Attached only now, so the final record can't be overwritten by the 'running' one
+            future.add_done_callback(lambda finished, job=job: self._finished(job, finished))
+        for job in failed:
+            self._save_job(job)
+            if job.on_complete:
+                self._callback_executor.submit(self._run_callback, job)
+    
+    def _start(self, job: Job):
+        """Hand a job to the worker pool (lock held); returns its future, or None if it could not be submitted"""
+        job.started_at = time.time()
+        func, args = job.func, job.args
+        if job.profile_path:
+            func, args = run_profiled, (job.profile_path, job.func) + tuple(job.args)
+        try:
+            try:
+                future = self._executor.submit(func, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); replace the pool and retry once
+                logger.error("Job worker pool is broken, restarting it")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_MP_CONTEXT)
+                future = self._executor.submit(func, *args)
+        except Exception as e:
+            # Fail the job rather than leak its worker slot and leave the user without a reply
+            logger.error(f"Job {job.job_id} ({job.kind}) could not be started: {e}")
+            job.finished_at = time.time()
+            job.error = e
+            job.status = 'failed'
+            return None
+        
+        job.status = 'running'
+        self._running += 1
+        self._running_by_user[job.user_id] = self._running_by_user.get(job.user_id, 0) + 1
+        return future
+    
+    def _finished(self, job: Job, future):
+        with self._lock:
+            self._running -= 1
+            remaining = self._running_by_user.get(job.user_id, 1) - 1
+            if remaining:
+                self._running_by_user[job.user_id] = remaining
+            else:
+                self._running_by_user.pop(job.user_id, None)
+        
+        job.finished_at = time.time()
+        try:
+            job.result = future.result()
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.kind}) failed: {e}")
+            job.error = e
+            job.status = 'failed'
+        self._save_job(job)
+        if job.profile_path:
+            self._save_profile(job)
+        
+        self._dispatch()
+        if job.on_complete:
+            self._callback_executor.submit(self._run_callback, job)
+    
+    def _save_job(self, job: Job, new: bool = False):
+        if self.store is None:
+            return
+        try:
+            if new:
+                self.store.record_job(job)
+            else:
+                self.store.update_job(job)
+        except Exception as e:
+            # Job records are bookkeeping; never fail the job over them
+            logger.error(f"Error saving record of job {job.job_id}: {e}")
+    
+    def _apply_profiling_env_request(self):
+        """Queue PROFILE_NEXT_JOBS profiling runs the first time that value is seen, not on every restart"""
+        try:
+            if self.store.apply_profiling_env_request(PROFILE_NEXT_JOBS):
+                logger.info(f"Profiling the next {PROFILE_NEXT_JOBS} jobs (PROFILE_NEXT_JOBS)")
+        except Exception as e:
+            logger.error(f"Error applying PROFILE_NEXT_JOBS: {e}")
+    
+    def _claim_profiling(self) -> bool:
+        """Whether the next job should be profiled (requested via PROFILE_NEXT_JOBS or the dashboard)"""
+        if self.store is None:
+            return False
+        try:
+            return self.store.claim_profiling_slot()
+        except Exception as e:
+            logger.error(f"Error checking for profiling requests: {e}")
+            return False
+    
+    def _save_profile(self, job: Job):
+        """Record a profiled job's output and drop the oldest profiles beyond PROFILE_KEEP"""
+        if not os.path.exists(job.profile_path):
+            # The worker died before it could write the stats
+            return
+        try:
+            self.store.record_job_profile(job.job_id, job.profile_path, profile_summary_path(job.profile_path))
+            for old_profile in self.store.prune_job_profiles(PROFILE_KEEP):
+                for path in (old_profile['path'], old_profile['summary_path']):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+        except Exception as e:
+            logger.error(f"Error saving profile of job {job.job_id}: {e}")
+    
+    def _run_callback(self, job: Job):
+        try:
+            job.on_complete(job)
+        except Exception as e:
+            logger.error(f"Error delivering result of job {job.job_id}: {e}")
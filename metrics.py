@@ -0,0 +1,271 @@
+"""
+Job metrics: per-stage latency histograms, counters and gauges
+
+Worker processes accumulate stage timings and counters for the job they are running
+(see timed() and count()) and hand them back with the job result. The bot folds them
+into a MetricsRegistry and periodically writes a JSON snapshot to METRICS_PATH, which
+the web dashboard reads for its live panel and Prometheus /metrics endpoint.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import METRICS_PATH
+
+# Upper bounds in seconds; wide enough for OCR of large scans
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGES = ('queue', 'download', 'extract', 'ocr', 'translate', 'docx', 'upload', 'total')
+
+# Per-process accumulation for the job currently running in this process
+_job_lock = threading.Lock()
+_job_stages = {}
+_job_counters = {}
+
+def add_stage_time(stage: str, seconds: float):
+    with _job_lock:
+        _job_stages[stage] = _job_stages.get(stage, 0.0) + seconds
+
+def count(counter: str, amount: int = 1):
+    with _job_lock:
+        _job_counters[counter] = _job_counters.get(counter, 0) + amount
+
+@contextmanager
+def timed(stage: str):
+    """Add the time spent in the block to a stage of the current job"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - started)
+
+def take_job_metrics() -> dict:
+    """Return and reset what this process recorded since the last call"""
+    global _job_stages, _job_counters
+    with _job_lock:
+        job_metrics = {'stages': _job_stages, 'counters': _job_counters}
+        _job_stages = {}
+        _job_counters = {}
+    return job_metrics
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+    
+    def to_dict(self) -> dict:
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            running += bucket_count
+            cumulative.append([bound, running])
+        return {'buckets': cumulative, 'sum': round(self.sum, 6), 'count': self.count}
+
+class MetricsRegistry:
+    def __init__(self, path: str = None):
+        self.path = path or METRICS_PATH
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels key) -> value
+        self._histograms = {}  # (name, labels key) -> Histogram
+        self._gauges = {}  # name -> zero-argument callable, read at snapshot time
+        self.started_at = time.time()
+    
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+    
+    def gauge(self, name: str, read):
+        """Register a callable whose value is sampled whenever a snapshot is taken"""
+        self._gauges[name] = read
+    
+    @contextmanager
+    def timed(self, stage: str, **labels):
+        """Observe the time spent in the block as a stage latency"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - started, stage=stage, **labels)
+    
+    def record_job(self, kind: str, file_format: str, status: str, job_metrics: dict = None,
+                   queue_seconds: float = None, total_seconds: float = None):
+        """Fold a finished job and the metrics its worker returned into the registry"""
+        self.inc('jobs_total', kind=kind, format=file_format, status=status)
+        if queue_seconds is not None:
+            self.observe('stage_seconds', queue_seconds, stage='queue', kind=kind)
+        if total_seconds is not None:
+            self.observe('stage_seconds', total_seconds, stage='total', kind=kind)
+        job_metrics = job_metrics or {}
+        for stage, seconds in job_metrics.get('stages', {}).items():
+            self.observe('stage_seconds', seconds, stage=stage, kind=kind)
+        for counter, amount in job_metrics.get('counters', {}).items():
+            self.inc(counter, amount)
+    
+    def snapshot(self) -> dict:
+        gauges = {}
+        for name, read in self._gauges.items():
+            try:
+                gauges[name] = read()
+            except Exception:
+                gauges[name] = None
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': self.started_at,
+                'updated_at': time.time(),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [{'name': name, 'labels': dict(labels), **histogram.to_dict()}
+                               for (name, labels), histogram in self._histograms.items()],
+                'gauges': gauges,
+            }
+    
+    def write(self):
+        """Atomically replace the stats file read by the dashboard"""
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temp_path, self.path)
+
+def read_snapshot(path: str = None):
+    """Load the bot's last metrics snapshot, or None if there is none"""
+    try:
+        with open(path or METRICS_PATH, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def histogram_quantile(histogram: dict, quantile: float):
+    """Estimate a quantile from cumulative buckets by linear interpolation, as Prometheus does"""
+    total = histogram['count']
+    if not total:
+        return None
+    rank = quantile * total
+    previous_bound, previous_count = 0.0, 0
+    for bound, cumulative in histogram['buckets']:
+        if cumulative >= rank:
+            if bound == '+Inf':
+                return previous_bound
+            if cumulative == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (cumulative - previous_count)
+        previous_bound, previous_count = bound, cumulative
+    return previous_bound
+
+def summarize(snapshot: dict) -> dict:
+    """Condense a snapshot into what the dashboard panel shows"""
+    counters = {}
+    jobs = {}
+    for counter in snapshot['counters']:
+        if counter['name'] == 'jobs_total':
+            labels = counter['labels']
+            row = jobs.setdefault(labels.get('format') or '?', {'done': 0, 'failed': 0})
+            row[labels.get('status', 'done')] = row.get(labels.get('status', 'done'), 0) + counter['value']
+        else:
+            counters[counter['name']] = counters.get(counter['name'], 0) + counter['value']
+    
+    stages = {}
+    for histogram in snapshot['histograms']:
+        if histogram['name'] != 'stage_seconds':
+            continue
+        stage = histogram['labels'].get('stage')
+        merged = stages.setdefault(stage, {'buckets': None, 'count': 0, 'sum': 0.0})
+        if merged['buckets'] is None:
+            merged['buckets'] = [list(bucket) for bucket in histogram['buckets']]
+        else:
+            for merged_bucket, bucket in zip(merged['buckets'], histogram['buckets']):
+                merged_bucket[1] += bucket[1]
+        merged['count'] += histogram['count']
+        merged['sum'] += histogram['sum']
+    # A list, so the pipeline order survives JSON serialization with sorted keys
+    stage_latency = [
+        {
+            'stage': stage,
+            'count': stages[stage]['count'],
+            'p50_ms': round(histogram_quantile(stages[stage], 0.5) * 1000, 1),
+            'p95_ms': round(histogram_quantile(stages[stage], 0.95) * 1000, 1),
+        }
+        for stage in STAGES if stage in stages and stages[stage]['count']
+    ]
+    
+    def hit_rate(prefix: str):
+        hits = counters.get(f'{prefix}_hits', 0)
+        lookups = hits + counters.get(f'{prefix}_misses', 0)
+        return round(hits / lookups, 3) if lookups else None
+    
+    uptime = snapshot['updated_at'] - snapshot['started_at']
+    finished = sum(row.get('done', 0) for row in jobs.values())
+    return {
+        'updated_at': snapshot['updated_at'],
+        'jobs_by_format': jobs,
+        'jobs_per_minute': round(finished / uptime * 60, 2) if uptime > 0 else None,
+        'stage_latency': stage_latency,
+        'conversion_cache_hit_rate': hit_rate('conversion_cache_text'),
+        'docx_cache_hit_rate': hit_rate('conversion_cache_docx'),
+        'translation_memory_hit_rate': hit_rate('translation_memory'),
+        'gauges': snapshot['gauges'],
+    }
+
+def render_prometheus(snapshot: dict, prefix: str = 'bot_') -> str:
+    """Render a snapshot in the Prometheus text exposition format"""
+    def label_text(labels: dict, extra: dict = None) -> str:
+        items = {**labels, **(extra or {})}
+        if not items:
+            return ''
+        escaped = (
+            f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for key, value in items.items()
+        )
+        return '{' + ','.join(escaped) + '}'
+    
+    lines = []
+    typed = set()
+    # Every sample of a metric family must follow its TYPE line, so group by name
+    for counter in sorted(snapshot['counters'], key=lambda counter: counter['name']):
+        name = f"{prefix}{counter['name']}"
+        if name not in typed:
+            lines.append(f'# TYPE {name} counter')
+            typed.add(name)
+        lines.append(f"{name}{label_text(counter['labels'])} {counter['value']}")
+    for histogram in sorted(snapshot['histograms'], key=lambda histogram: histogram['name']):
+        name = f"{prefix}{histogram['name']}"
+        if name not in typed:
+            lines.append(f'# TYPE {name} histogram')
+            typed.add(name)
+        for bound, cumulative in histogram['buckets']:
+            lines.append(f"{name}_bucket{label_text(histogram['labels'], {'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{label_text(histogram['labels'])} {histogram['sum']}")
+        lines.append(f"{name}_count{label_text(histogram['labels'])} {histogram['count']}")
+    for gauge, value in snapshot['gauges'].items():
+        if isinstance(value, (int, float)):
+            lines.append(f'# TYPE {prefix}{gauge} gauge')
+            lines.append(f'{prefix}{gauge} {value}')
+    lines.append(f'# TYPE {prefix}metrics_age_seconds gauge')
+    lines.append(f"{prefix}metrics_age_seconds {round(time.time() - snapshot['updated_at'], 3)}")
+    return '\n'.join(lines) + '\n'
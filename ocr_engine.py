@@ -0,0 +1,139 @@
+"""
+OCR engine with image preprocessing and parallel tiled recognition
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import pytesseract
+from PIL import Image, ImageOps
+import metrics
+import tracing
+from config import (
+    OCR_WORKERS, OCR_LANGUAGE, OCR_PSM, OCR_OEM, OCR_TARGET_DPI,
+    OCR_MAX_DIMENSION, OCR_BINARIZE, OCR_TILE_HEIGHT, OCR_TILE_SEAM_SEARCH
+)
+
+logger = logging.getLogger(__name__)
+
+# Upscaling beyond this rarely helps Tesseract and makes every tile slower
+MAX_UPSCALE = 2.0
+
+def _ocr_tile(tile: Image.Image, lang: str, tesseract_config: str) -> str:
+    """Run Tesseract on a single tile (runs in a worker process)"""
+    return pytesseract.image_to_string(tile, lang=lang, config=tesseract_config)
+
+def _otsu_threshold(histogram: list) -> int:
+    """Pick the grey level that best separates text from background"""
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background_weight = 0
+    background_sum = 0
+    best_threshold = 127
+    best_variance = 0.0
+    
+    for level, count in enumerate(histogram):
+        background_weight += count
+        if background_weight == 0:
+            continue
+        foreground_weight = total - background_weight
+        if foreground_weight == 0:
+            break
+        background_sum += level * count
+        background_mean = background_sum / background_weight
+        foreground_mean = (weighted_total - background_sum) / foreground_weight
+        variance = background_weight * foreground_weight * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = level
+    
+    return best_threshold
+
+class OCREngine:
+    def __init__(self, workers: int = None, lang: str = None, psm: int = None, oem: int = None,
+                 target_dpi: int = None, binarize: bool = None):
+        self.workers = OCR_WORKERS if workers is None else workers
+        self.lang = lang or OCR_LANGUAGE
+        self.psm = OCR_PSM if psm is None else psm
+        self.oem = OCR_OEM if oem is None else oem
+        self.target_dpi = target_dpi or OCR_TARGET_DPI
+        self.binarize = OCR_BINARIZE if binarize is None else binarize
+        self.max_dimension = OCR_MAX_DIMENSION
+        self.tile_height = OCR_TILE_HEIGHT
+        self.seam_search = OCR_TILE_SEAM_SEARCH
+    
+    @tracing.traced('ocr')
+    def image_to_string(self, image: Image.Image) -> str:
+        """Preprocess an image, OCR it tile by tile and return the merged text"""
+        with metrics.timed('ocr'):
+            image, dpi = self.preprocess(image)
+            tesseract_config = f'--psm {self.psm} --oem {self.oem} --dpi {dpi}'
+            tiles = self.split_into_tiles(image)
+            
+            if len(tiles) == 1 or self.workers <= 1:
+                texts = [_ocr_tile(tile, self.lang, tesseract_config) for tile in tiles]
+            else:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(tiles))) as executor:
+                    texts = list(executor.map(_ocr_tile, tiles, repeat(self.lang), repeat(tesseract_config)))
+            
+            return self._merge_tile_texts(texts)
+    
+    def preprocess(self, image: Image.Image):
+        """Normalise orientation, colour and resolution; returns the image and its effective DPI"""
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'L':
+            image = image.convert('L')
+        
+        dpi = image.info.get('dpi', (0, 0))[0]
+        width, height = image.size
+        scale = min(self.target_dpi / float(dpi), MAX_UPSCALE) if dpi else 1.0
+        # Only the width is capped, since tall pages are tiled, and only upscaling is limited,
+        # so a page is never scaled below the target DPI
+        if scale > 1.0 and width * scale > self.max_dimension:
+            scale = max(1.0, self.max_dimension / float(width))
+        
+        if abs(scale - 1.0) > 0.05:
+            image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+        
+        if self.binarize:
+            threshold = _otsu_threshold(image.histogram())
+            image = image.point([0 if level <= threshold else 255 for level in range(256)])
+        
+        effective_dpi = round(dpi * scale) if dpi else self.target_dpi
+        return image, effective_dpi
+    
+    def split_into_tiles(self, image: Image.Image) -> list:
+        """Split a tall image into full-width horizontal strips, cutting along blank rows between text lines"""
+        width, height = image.size
+        if height <= self.tile_height + self.seam_search:
+            return [image]
+        
+        # Ink becomes 255, so a row's histogram counts its ink pixels
+        threshold = _otsu_threshold(image.histogram())
+        ink = image.point([255 if level <= threshold else 0 for level in range(256)])
+        
+        tiles = []
+        top = 0
+        while height - top > self.tile_height + self.seam_search:
+            seam = self._find_seam(ink, top + self.tile_height)
+            tiles.append(image.crop((0, top, width, seam)))
+            top = seam
+        tiles.append(image.crop((0, top, width, height)))
+        return tiles
+    
+    def _find_seam(self, ink: Image.Image, bottom: int) -> int:
+        """Return the row at or above bottom to cut at: the nearest blank row, else the one with least ink"""
+        width = ink.size[0]
+        best_row, best_ink = bottom, None
+        for row in range(bottom, bottom - self.seam_search, -1):
+            row_ink = ink.crop((0, row, width, row + 1)).histogram()[255]
+            if row_ink == 0:
+                return row
+            if best_ink is None or row_ink < best_ink:
+                best_row, best_ink = row, row_ink
+        return best_row
+    
+    @staticmethod
+    def _merge_tile_texts(texts: list) -> str:
+        """Join tile texts; tiles are cut between text lines, so no line appears in two tiles"""
+        return '\n'.join(line for text in texts for line in text.splitlines())
@@ -0,0 +1,322 @@
+"""
+Shared database for authorized users, bot session state and job records
+SQLite by default; set DATABASE_URL to use PostgreSQL instead
+"""
+
+import json
+import logging
+import os
+import time
+from sqlalchemy import (
+    create_engine, event, MetaData, Table, Column, String, Integer, Float, Text, select, insert, update, delete, func
+)
+from sqlalchemy.exc import IntegrityError
+from config import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+authorized_users_table = Table(
+    'authorized_users', metadata,
+    Column('user_id', String(32), primary_key=True),
+    Column('added_at', Float, nullable=False)
+)
+
+# Single row bumped on every ACL change, so readers can detect changes with one primary-key lookup
+acl_version_table = Table(
+    'acl_version', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('version', Integer, nullable=False)
+)
+
+user_sessions_table = Table(
+    'user_sessions', metadata,
+    Column('user_id', String(32), primary_key=True),
+    Column('data', Text, nullable=False),
+    Column('updated_at', Float, nullable=False)
+)
+
+jobs_table = Table(
+    'jobs', metadata,
+    Column('job_id', String(32), primary_key=True),
+    Column('user_id', String(32), nullable=False, index=True),
+    Column('kind', String(16), nullable=False),
+    Column('status', String(16), nullable=False, index=True),
+    Column('priority', Integer, nullable=False),
+    Column('original_filename', Text),
+    Column('created_at', Float, nullable=False, index=True),
+    Column('started_at', Float),
+    Column('finished_at', Float),
+    Column('error', Text)
+)
+
+# Single row holding how many upcoming jobs should run under the profiler
+profiling_table = Table(
+    'profiling', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('remaining', Integer, nullable=False),
+    Column('env_request', Integer)  # PROFILE_NEXT_JOBS value already applied, so restarts don't repeat it
+)
+
+# Profiler output of a job, kept in its own table so existing databases need no migration
+job_profiles_table = Table(
+    'job_profiles', metadata,
+    Column('job_id', String(32), primary_key=True),
+    Column('path', Text, nullable=False),
+    Column('summary_path', Text),
+    Column('created_at', Float, nullable=False, index=True)
+)
+
+class Store:
+    def __init__(self, database_url: str = None):
+        self.database_url = database_url or DATABASE_URL
+        is_sqlite = self.database_url.startswith('sqlite')
+        self.engine = create_engine(
+            self.database_url,
+            pool_pre_ping=True,
+            connect_args={'timeout': 30, 'check_same_thread': False} if is_sqlite else {}
+        )
+        if is_sqlite:
+            # WAL lets the dashboard write while the bot reads
+            event.listen(self.engine, 'connect', lambda connection, record: connection.execute('PRAGMA journal_mode=WAL'))
+        metadata.create_all(self.engine)
+    
+    # Authorized users
+    
+    def list_authorized_users(self) -> list:
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(authorized_users_table.c.user_id).order_by(authorized_users_table.c.added_at)
+            )
+            return [row.user_id for row in rows]
+    
+    def add_authorized_user(self, user_id: str) -> bool:
+        """Add a user; returns False if they were already authorized"""
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(authorized_users_table).values(user_id=str(user_id), added_at=time.time()))
+                self._bump_acl_version(connection)
+            return True
+        except IntegrityError:
+            return False
+    
+    def remove_authorized_user(self, user_id: str) -> bool:
+        """Remove a user; returns False if they were not authorized"""
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                delete(authorized_users_table).where(authorized_users_table.c.user_id == str(user_id))
+            )
+            if result.rowcount == 0:
+                return False
+            self._bump_acl_version(connection)
+        return True
+    
+    def count_authorized_users(self) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(authorized_users_table)).scalar_one()
+    
+    def acl_version(self) -> int:
+        with self.engine.connect() as connection:
+            version = connection.execute(
+                select(acl_version_table.c.version).where(acl_version_table.c.id == 1)
+            ).scalar_one_or_none()
+            return version or 0
+    
+    def import_authorized_users_file(self, file_path: str):
+        """One-time migration from authorized_users.json
+        
+        Every ACL change creates the acl_version row, so its presence means the table is
+        already in use (or was imported before) even if every user has since been removed.
+        """
+        if not os.path.exists(file_path) or self._acl_initialized():
+            return
+        try:
+            with open(file_path, 'r') as f:
+                users = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading {file_path} for migration: {e}")
+            return
+        
+        now = time.time()
+        try:
+            with self.engine.begin() as connection:
+                for user_id in dict.fromkeys(str(user) for user in users):
+                    connection.execute(insert(authorized_users_table).values(user_id=user_id, added_at=now))
+                self._bump_acl_version(connection)
+            logger.info(f"Imported {len(users)} authorized users from {file_path}")
+        except IntegrityError:
+            # The bot and dashboard both migrate on startup; the other one got there first
+            pass
+    
+    def _acl_initialized(self) -> bool:
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(acl_version_table.c.id).where(acl_version_table.c.id == 1)
+            ).first() is not None
+    
+    def _bump_acl_version(self, connection):
+        result = connection.execute(
+            update(acl_version_table).where(acl_version_table.c.id == 1)
+            .values(version=acl_version_table.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(acl_version_table).values(id=1, version=1))
+    
+    # Per-user bot session state
+    
+    def load_sessions(self) -> dict:
+        """Return {user_id: data} for every stored session"""
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(user_sessions_table.c.user_id, user_sessions_table.c.data))
+            return {row.user_id: json.loads(row.data) for row in rows}
+    
+    def load_session(self, user_id):
+        """Return (data, updated_at) for one user's session, or None if there is none"""
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(user_sessions_table.c.data, user_sessions_table.c.updated_at)
+                .where(user_sessions_table.c.user_id == str(user_id))
+            ).first()
+            return None if row is None else (json.loads(row.data), row.updated_at)
+    
+    def save_session(self, user_id, data: dict) -> float:
+        """Store a user's session; returns the updated_at it was saved with"""
+        values = {'data': json.dumps(data), 'updated_at': time.time()}
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                update(user_sessions_table).where(user_sessions_table.c.user_id == str(user_id)).values(**values)
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(user_sessions_table).values(user_id=str(user_id), **values))
+        return values['updated_at']
+    
+    def delete_session(self, user_id):
+        with self.engine.begin() as connection:
+            connection.execute(delete(user_sessions_table).where(user_sessions_table.c.user_id == str(user_id)))
+    
+    # Job records
+    
+    def record_job(self, job):
+        with self.engine.begin() as connection:
+            connection.execute(insert(jobs_table).values(
+                job_id=job.job_id,
+                user_id=str(job.user_id),
+                kind=job.kind,
+                status=job.status,
+                priority=job.priority,
+                original_filename=job.context.get('original_filename'),
+                created_at=job.created_at
+            ))
+    
+    def update_job(self, job):
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(jobs_table).where(jobs_table.c.job_id == job.job_id).values(
+                    status=job.status,
+                    started_at=job.started_at,
+                    finished_at=job.finished_at,
+                    error=str(job.error) if job.error is not None else None
+                )
+            )
+    
+    def recent_jobs(self, limit: int = 50) -> list:
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(jobs_table).order_by(jobs_table.c.created_at.desc()).limit(limit))
+            return [dict(row._mapping) for row in rows]
+    
+    # Job profiling
+    
+    def request_profiling(self, count: int):
+        """Profile the next count jobs, replacing any earlier request"""
+        with self.engine.begin() as connection:
+            result = connection.execute(update(profiling_table).where(profiling_table.c.id == 1).values(remaining=count))
+            if result.rowcount == 0:
+                connection.execute(insert(profiling_table).values(id=1, remaining=count))
+    
+    def apply_profiling_env_request(self, count: int) -> bool:
+        """Apply a PROFILE_NEXT_JOBS request once; returns False if this value was already applied.
+        
+        A count of 0 forgets the applied value, so setting the same count again later applies it.
+        """
+        try:
+            with self.engine.begin() as connection:
+                if not count:
+                    connection.execute(
+                        update(profiling_table)
+                        .where(profiling_table.c.id == 1, profiling_table.c.env_request.isnot(None))
+                        .values(env_request=None)
+                    )
+                    return False
+                applied = connection.execute(
+                    select(profiling_table.c.env_request).where(profiling_table.c.id == 1)
+                ).scalar_one_or_none()
+                if applied == count:
+                    return False
+                result = connection.execute(
+                    update(profiling_table).where(profiling_table.c.id == 1).values(remaining=count, env_request=count)
+                )
+                if result.rowcount == 0:
+                    connection.execute(insert(profiling_table).values(id=1, remaining=count, env_request=count))
+            return True
+        except IntegrityError:
+            # Another bot process starting at the same time applied it first
+            return False
+    
+    def profiling_remaining(self) -> int:
+        with self.engine.connect() as connection:
+            remaining = connection.execute(
+                select(profiling_table.c.remaining).where(profiling_table.c.id == 1)
+            ).scalar_one_or_none()
+            return remaining or 0
+    
+    def claim_profiling_slot(self) -> bool:
+        """Take one of the requested profiling runs; False when none are left"""
+        # Read first so unprofiled jobs never take a write lock
+        if not self.profiling_remaining():
+            return False
+        with self.engine.begin() as connection:
+            # Conditional decrement, so concurrent bot processes can't both take the last slot
+            result = connection.execute(
+                update(profiling_table).where(profiling_table.c.id == 1, profiling_table.c.remaining > 0)
+                .values(remaining=profiling_table.c.remaining - 1)
+            )
+            return result.rowcount == 1
+    
+    def record_job_profile(self, job_id: str, path: str, summary_path: str = None):
+        with self.engine.begin() as connection:
+            connection.execute(insert(job_profiles_table).values(
+                job_id=job_id, path=path, summary_path=summary_path, created_at=time.time()
+            ))
+    
+    def job_profile(self, job_id: str):
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(job_profiles_table).where(job_profiles_table.c.job_id == job_id)
+            ).first()
+            return dict(row._mapping) if row else None
+    
+    def recent_job_profiles(self, limit: int = 20) -> list:
+        """Profiles with the record of the job they belong to, newest first"""
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(
+                    job_profiles_table, jobs_table.c.kind, jobs_table.c.status, jobs_table.c.original_filename,
+                    jobs_table.c.started_at, jobs_table.c.finished_at
+                )
+                .select_from(job_profiles_table.outerjoin(jobs_table, jobs_table.c.job_id == job_profiles_table.c.job_id))
+                .order_by(job_profiles_table.c.created_at.desc()).limit(limit)
+            )
+            return [dict(row._mapping) for row in rows]
+    
+    def prune_job_profiles(self, keep: int) -> list:
+        """Forget all but the newest keep profiles and return the rows removed, so their files can be deleted"""
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                select(job_profiles_table).order_by(job_profiles_table.c.created_at.desc()).offset(keep)
+            ).fetchall()
+            if rows:
+                connection.execute(
+                    delete(job_profiles_table).where(job_profiles_table.c.job_id.in_([row.job_id for row in rows]))
+                )
+            return [dict(row._mapping) for row in rows]
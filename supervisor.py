@@ -0,0 +1,278 @@
+"""
+Supervisor that runs the bot as a child process of the web dashboard
+
+The child proves it is alive by rewriting a heartbeat file, stamped with its PID, from
+its event loop, and is restarted with exponential backoff if it exits or stops
+heartbeating. Any bot that heartbeats is treated as running, including one started by
+another dashboard worker or by hand; status comes from the heartbeat, not a scan of
+the process table.
+"""
+
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from config import (
+    BOT_HEARTBEAT_PATH, BOT_HEARTBEAT_TIMEOUT, BOT_READY_TIMEOUT, BOT_LOG_PATH,
+    BOT_RESTART_BACKOFF_MAX
+)
+
+logger = logging.getLogger(__name__)
+
+# A child that stays up this long has its restart backoff reset
+STABLE_AFTER = 60
+
+def write_heartbeat(path: str = None):
+    """Record that this process is alive (called periodically by the bot)"""
+    path = path or BOT_HEARTBEAT_PATH
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump({'pid': os.getpid(), 'time': time.time()}, file)
+    os.replace(temp_path, path)
+
+def read_heartbeat(path: str = None):
+    """Return (pid, timestamp) of the last heartbeat, or (None, None)"""
+    try:
+        with open(path or BOT_HEARTBEAT_PATH, 'r') as file:
+            heartbeat = json.load(file)
+        return heartbeat['pid'], heartbeat['time']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class BotSupervisor:
+    def __init__(self, command: list = None, env: dict = None, cwd: str = None):
+        self.command = command or [sys.executable, 'app.py']
+        self.env = env
+        self.cwd = cwd or os.getcwd()
+        self.heartbeat_path = BOT_HEARTBEAT_PATH
+        self.heartbeat_timeout = BOT_HEARTBEAT_TIMEOUT
+        self.ready_timeout = BOT_READY_TIMEOUT
+        self.max_backoff = BOT_RESTART_BACKOFF_MAX
+        self._lock = threading.RLock()
+        self._ready = threading.Condition(self._lock)
+        self._process = None  # Popen for a child started by this supervisor
+        self._state = 'stopped'  # stopped, starting, running, restarting, stopping
+        self._wanted = False  # Whether the bot should be kept running
+        self._started_at = None
+        self._restarts = 0
+        self._backoff = 1
+        self._restart_at = None
+        self._last_exit_code = None
+        self._monitor = None
+        self._stop_monitor = threading.Event()
+    
+    def start(self) -> bool:
+        """(Re)start the bot and wait until its first heartbeat; returns whether it became ready"""
+        # Stops a bot started elsewhere too, so there is never a second poller fighting over getUpdates
+        self.stop()
+        with self._lock:
+            self._wanted = True
+            self._backoff = 1
+            self._spawn()
+            self._ensure_monitor()
+            self._ready.wait_for(lambda: self._state != 'starting', timeout=self.ready_timeout)
+            if self._state == 'running':
+                logger.info("Bot started successfully")
+                return True
+        
+        logger.error(f"Bot failed to start: {self.log_tail()}")
+        return False
+    
+    def stop(self) -> bool:
+        """Stop the bot, whether this supervisor or another dashboard process started it"""
+        with self._lock:
+            self._wanted = False
+            self._restart_at = None
+            process = self._process
+            pid = process.pid if process else self._external_pid()
+            if not pid:
+                self._state = 'stopped'
+                return True
+            self._state = 'stopping'
+        
+        try:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            else:
+                os.kill(pid, signal.SIGTERM)
+                deadline = time.monotonic() + 10
+                while _pid_alive(pid) and time.monotonic() < deadline:
+                    time.sleep(0.1)
+                if _pid_alive(pid):
+                    os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        
+        with self._lock:
+            if process is not None:
+                self._last_exit_code = process.returncode
+            self._process = None
+            self._state = 'stopped'
+        logger.info("Bot stopped")
+        return True
+    
+    def send_signal(self, signum: int) -> bool:
+        """Signal the bot if it is running; returns whether a signal was sent.
+        
+        A child that is still starting may not have installed its handlers yet, and the
+        default action for signals like SIGHUP would kill it, so it is skipped.
+        """
+        status = self.status()
+        if not status['running'] or not status['pid']:
+            return False
+        os.kill(status['pid'], signum)
+        return True
+    
+    def pid(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return self._process.pid
+        return self._external_pid()
+    
+    def is_running(self) -> bool:
+        return self.status()['running']
+    
+    def status(self) -> dict:
+        """Current state without scanning the process table"""
+        with self._lock:
+            state = self._state
+            pid = None
+            if self._process is not None:
+                pid = self._process.pid
+            elif state == 'stopped':
+                # Possibly started by another dashboard worker
+                pid = self._external_pid()
+                if pid:
+                    state = 'running'
+            heartbeat_pid, heartbeat_time = read_heartbeat(self.heartbeat_path)
+            heartbeat_age = time.time() - heartbeat_time if heartbeat_pid == pid and heartbeat_time else None
+            return {
+                'state': state,
+                'running': state == 'running',
+                'pid': pid,
+                'heartbeat_age': round(heartbeat_age, 1) if heartbeat_age is not None else None,
+                'uptime': round(time.time() - self._started_at, 1) if self._started_at and self._process else None,
+                'restarts': self._restarts,
+                'last_exit_code': self._last_exit_code,
+            }
+    
+    def log_tail(self, lines: int = 20) -> str:
+        try:
+            with open(BOT_LOG_PATH, 'r', errors='replace') as log_file:
+                return ''.join(log_file.readlines()[-lines:]).strip()
+        except OSError:
+            return ''
+    
+    def shutdown(self):
+        """Stop the monitor thread and the bot (for dashboard shutdown)"""
+        self._stop_monitor.set()
+        self.stop()
+    
+    def _spawn(self):
+        log_file = open(BOT_LOG_PATH, 'ab')
+        try:
+            self._process = subprocess.Popen(self.command, env=self.env, cwd=self.cwd,
+                                             stdout=log_file, stderr=subprocess.STDOUT)
+        finally:
+            # The child holds its own descriptor
+            log_file.close()
+        self._state = 'starting'
+        self._started_at = time.time()
+        self._restart_at = None
+    
+    def _external_pid(self):
+        """PID of a bot this supervisor did not spawn, if one is alive and heartbeating.
+        
+        Every bot process heartbeats with its own PID, so this finds bots started by other
+        dashboard workers and by hand (python app.py) alike.
+        """
+        heartbeat_pid, heartbeat_time = read_heartbeat(self.heartbeat_path)
+        fresh = heartbeat_pid and heartbeat_time and time.time() - heartbeat_time < self.heartbeat_timeout
+        return heartbeat_pid if fresh and _pid_alive(heartbeat_pid) else None
+    
+    def _ensure_monitor(self):
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._monitor_loop, name='bot-supervisor', daemon=True)
+            self._monitor.start()
+    
+    def _monitor_loop(self):
+        while not self._stop_monitor.wait(0.5):
+            try:
+                self._check()
+            except Exception as e:
+                logger.error(f"Error supervising bot: {e}")
+    
+    def _check(self):
+        with self._lock:
+            now = time.time()
+            if self._state == 'restarting':
+                if self._wanted and now >= self._restart_at:
+                    logger.info(f"Restarting bot (restart #{self._restarts})")
+                    self._spawn()
+                return
+            if self._process is None or self._state not in ('starting', 'running'):
+                return
+            
+            exit_code = self._process.poll()
+            heartbeat_pid, heartbeat_time = read_heartbeat(self.heartbeat_path)
+            beating = heartbeat_pid == self._process.pid and heartbeat_time and heartbeat_time >= self._started_at
+            
+            if exit_code is None and self._state == 'starting':
+                if beating:
+                    self._state = 'running'
+                    self._ready.notify_all()
+                elif now - self._started_at > self.ready_timeout:
+                    logger.error("Bot did not report ready in time")
+                    self._kill_for_restart()
+                return
+            
+            if exit_code is None:
+                if not beating or now - heartbeat_time > self.heartbeat_timeout:
+                    logger.error("Bot stopped heartbeating")
+                    self._kill_for_restart()
+                    return
+                if now - self._started_at > STABLE_AFTER:
+                    self._backoff = 1
+                return
+            
+            logger.error(f"Bot exited with code {exit_code}")
+            self._last_exit_code = exit_code
+            self._schedule_restart()
+    
+    def _kill_for_restart(self):
+        self._process.kill()
+        self._process.wait()
+        self._last_exit_code = self._process.returncode
+        self._schedule_restart()
+    
+    def _schedule_restart(self):
+        self._process = None
+        if not self._wanted:
+            self._state = 'stopped'
+        else:
+            self._state = 'restarting'
+            self._restarts += 1
+            self._restart_at = time.time() + self._backoff
+            logger.info(f"Restarting bot in {self._backoff}s")
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+        self._ready.notify_all()
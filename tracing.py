@@ -0,0 +1,186 @@
+"""
+Lightweight tracing spans exported as structured JSON logs
+
+Wrap a step in `with span('detect_language'):` or decorate a method with @traced().
+When tracing is off, span() hands back a shared no-op object, so instrumented code
+costs one flag check. Each finished span is written as one JSON line to
+TRACE_LOG_PATH (or to the 'trace' logger when that is empty), and all spans of a job
+share a trace id, including those recorded in worker processes: pass the bot's
+new_trace() value along with the job and continue it with span(name, parent=trace).
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from config import TRACING_ENABLED, TRACE_LOG_PATH
+
+trace_logger = logging.getLogger('trace')
+
+_enabled = TRACING_ENABLED
+_path = TRACE_LOG_PATH
+_current = contextvars.ContextVar('current_span', default=None)
+_export_lock = threading.Lock()
+_export_file = None
+_export_pid = None
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', '_token', '_start_time', '_started')
+    
+    def __init__(self, name: str, trace_id: str, parent_id: str, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self._token = None
+        self._start_time = None
+        self._started = None
+    
+    def set(self, **attributes):
+        """Attach attributes learned while the span is open"""
+        self.attributes.update(attributes)
+    
+    def context(self) -> tuple:
+        """(trace_id, span_id) for continuing this trace on another thread or process"""
+        return self.trace_id, self.span_id
+    
+    def __enter__(self):
+        self._token = _current.set(self)
+        self._start_time = time.time()
+        self._started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self._started
+        _current.reset(self._token)
+        error = None if exc is None else f'{exc_type.__name__}: {exc}'
+        _export_span(self, self._start_time, duration, error)
+        return False
+
+class _NoopSpan:
+    """Returned by span() while tracing is off; every operation does nothing"""
+    
+    __slots__ = ()
+    
+    def set(self, **attributes):
+        pass
+    
+    def context(self):
+        return None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def is_enabled() -> bool:
+    return _enabled
+
+def enable(path: str = None):
+    """Turn tracing on in this process (TRACING_ENABLED does this at import)"""
+    global _enabled, _path
+    _enabled = True
+    if path is not None:
+        _path = path
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def new_trace():
+    """Start a trace for a job; pass the result as parent= to its spans, here or in a worker"""
+    if not _enabled:
+        return None
+    return uuid.uuid4().hex, None
+
+def span(name: str, parent: tuple = None, **attributes):
+    """Open a span under parent (a new_trace() or Span.context() value), else under the current span"""
+    if not _enabled:
+        return _NOOP_SPAN
+    if parent is not None:
+        trace_id, parent_id = parent
+    else:
+        current = _current.get()
+        if current is not None:
+            trace_id, parent_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_id = uuid.uuid4().hex, None
+    return Span(name, trace_id, parent_id, attributes)
+
+def record_span(name: str, started_at: float, finished_at: float, parent: tuple = None, error: str = None,
+                **attributes):
+    """Export a span for an interval timed elsewhere (epoch seconds), e.g. a job timed by the scheduler"""
+    if not _enabled:
+        return
+    recorded = span(name, parent=parent, **attributes)
+    _export_span(recorded, started_at, finished_at - started_at, error)
+
+def traced(name: str = None):
+    """Decorator that runs each call of a function in a span named after it"""
+    def decorator(func):
+        span_name = name or func.__name__.lstrip('_')
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def wrap(func):
+    """Bind func to the current span so calls on pool threads stay in this trace"""
+    if not _enabled:
+        return func
+    parent = _current.get()
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+def _export_span(finished: Span, start_time: float, duration: float, error: str = None):
+    record = {
+        'trace_id': finished.trace_id,
+        'span_id': finished.span_id,
+        'parent_id': finished.parent_id,
+        'name': finished.name,
+        'start': round(start_time, 6),
+        'duration_ms': round(duration * 1000, 3),
+        'pid': os.getpid(),
+        'status': 'ok' if error is None else 'error',
+    }
+    if error is not None:
+        record['error'] = error
+    if finished.attributes:
+        record['attributes'] = finished.attributes
+    _export(record)
+
+def _export(record: dict):
+    global _export_file, _export_pid
+    line = json.dumps(record, default=str)
+    if not _path:
+        trace_logger.info(line)
+        return
+    try:
+        with _export_lock:
+            # Worker processes inherit the parent's handle, so each process opens its own
+            if _export_file is None or _export_pid != os.getpid():
+                _export_file = open(_path, 'a', encoding='utf-8', buffering=1)
+                _export_pid = os.getpid()
+            _export_file.write(line + '\n')
+    except OSError as e:
+        trace_logger.error(f"Error writing trace span: {e}")
@@ -0,0 +1,130 @@
+"""
+Translation services the Translator can send requests to
+"""
+
+import random
+import threading
+import time
+from config import TRANSLATION_BACKEND, FAKE_TRANSLATOR_LATENCY, FAKE_TRANSLATOR_RATE_LIMIT
+
+try:
+    from googletrans import Translator as GoogleTranslator
+except ImportError:
+    # Only needed by the google backend; the fake backend runs without it
+    GoogleTranslator = None
+
+class RateLimitExceeded(Exception):
+    """Raised by a backend when the service rejects a request for exceeding its rate limit"""
+
+class TranslationBackend:
+    """A translation service; implementations must be safe to call from several threads"""
+    
+    name = None
+    
+    def detect(self, text: str) -> tuple:
+        """Return (language code, confidence) for a sample of text"""
+        raise NotImplementedError
+    
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        """Translate one request's worth of text, keeping its line breaks"""
+        raise NotImplementedError
+    
+    def stats(self) -> dict:
+        return {}
+
+class GoogleTranslateBackend(TranslationBackend):
+    name = 'google'
+    
+    def __init__(self):
+        if GoogleTranslator is None:
+            raise ValueError("The google translation backend requires the googletrans package")
+        self._thread_local = threading.local()
+    
+    def detect(self, text: str) -> tuple:
+        detection = self._client().detect(text)
+        return detection.lang, detection.confidence
+    
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        return self._client().translate(text, src=source_lang, dest=target_lang).text
+    
+    def _client(self) -> GoogleTranslator:
+        """Return this thread's googletrans client (clients are not shared between threads)"""
+        client = getattr(self._thread_local, 'client', None)
+        if client is None:
+            client = GoogleTranslator()
+            self._thread_local.client = client
+        return client
+
+class FakeTranslationBackend(TranslationBackend):
+    """Offline stand-in that behaves like a remote service: every request costs latency,
+    requests beyond the rate limit are rejected, and the output is deterministic.
+    
+    Each non-empty line is returned prefixed with the target language, so line counts
+    and batch splitting behave as they would against the real service.
+    """
+    
+    name = 'fake'
+    
+    def __init__(self, latency: float = None, jitter: float = 0.0, rate_limit: float = None,
+                 failure_rate: float = 0.0, detected_lang: str = 'en', seed: int = 0):
+        self.latency = FAKE_TRANSLATOR_LATENCY if latency is None else latency  # Seconds per request
+        self.jitter = jitter  # Extra latency, uniformly up to this many seconds
+        self.rate_limit = FAKE_TRANSLATOR_RATE_LIMIT if rate_limit is None else rate_limit  # Requests/sec, 0 = none
+        self.failure_rate = failure_rate  # Fraction of requests that fail with a transient error
+        self.detected_lang = detected_lang
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(self.rate_limit or 0)
+        self._refilled_at = time.monotonic()
+        self._counters = {'detect_requests': 0, 'translate_requests': 0, 'characters': 0,
+                          'rate_limited': 0, 'failures': 0}
+    
+    def detect(self, text: str) -> tuple:
+        self._request('detect_requests', 0)
+        return self.detected_lang, 1.0
+    
+    def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+        self._request('translate_requests', len(text))
+        return '\n'.join(f'[{target_lang}] {line}' if line.strip() else line for line in text.split('\n'))
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+    
+    def reset_stats(self):
+        with self._lock:
+            for counter in self._counters:
+                self._counters[counter] = 0
+    
+    def _request(self, counter: str, characters: int):
+        with self._lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit)
+                self._refilled_at = now
+                if self._tokens < 1:
+                    self._counters['rate_limited'] += 1
+                    raise RateLimitExceeded("Too many requests")
+                self._tokens -= 1
+            self._counters[counter] += 1
+            self._counters['characters'] += characters
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self.failure_rate and self._random.random() < self.failure_rate
+            if failed:
+                self._counters['failures'] += 1
+        
+        time.sleep(delay)
+        if failed:
+            raise ConnectionError("Simulated transient failure")
+
+BACKENDS = {
+    GoogleTranslateBackend.name: GoogleTranslateBackend,
+    FakeTranslationBackend.name: FakeTranslationBackend,
+}
+
+def create_backend(name: str = None) -> TranslationBackend:
+    """Instantiate a backend by name (defaults to TRANSLATION_BACKEND)"""
+    name = name or TRANSLATION_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown translation backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,90 @@
+"""
+SQLite-backed translation memory for reusing previously translated segments
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import metrics
+from config import TRANSLATION_MEMORY_PATH
+
+logger = logging.getLogger(__name__)
+
+def normalize_segment(text: str) -> str:
+    """Collapse whitespace so trivially different copies of a segment share an entry"""
+    return ' '.join(text.split())
+
+def segment_hash(text: str) -> str:
+    """Return the lookup hash for a segment"""
+    return hashlib.sha256(normalize_segment(text).encode('utf-8')).hexdigest()
+
+class TranslationMemory:
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or TRANSLATION_MEMORY_PATH
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS segments ('
+            ' segment_hash TEXT NOT NULL,'
+            ' source_lang TEXT NOT NULL,'
+            ' target_lang TEXT NOT NULL,'
+            ' translation TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' PRIMARY KEY (segment_hash, source_lang, target_lang))'
+        )
+        self._connection.commit()
+    
+    def lookup(self, segments: list, source_lang: str, target_lang: str) -> list:
+        """Return cached translations aligned with segments, None where there is no entry"""
+        hashes = [segment_hash(segment) for segment in segments]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._connection.execute(
+                    f'SELECT segment_hash, translation FROM segments '
+                    f'WHERE source_lang = ? AND target_lang = ? AND segment_hash IN ({placeholders})',
+                    [source_lang, target_lang] + batch
+                )
+                found.update(rows)
+        
+        translations = [found.get(hash_value) for hash_value in hashes]
+        hit_count = sum(1 for translation in translations if translation is not None)
+        with self._lock:
+            self.hits += hit_count
+            self.misses += len(translations) - hit_count
+        metrics.count('translation_memory_hits', hit_count)
+        metrics.count('translation_memory_misses', len(translations) - hit_count)
+        return translations
+    
+    def store(self, pairs: list, source_lang: str, target_lang: str):
+        """Record (segment, translation) pairs"""
+        now = time.time()
+        rows = [(segment_hash(segment), source_lang, target_lang, translation, now) for segment, translation in pairs]
+        try:
+            with self._lock:
+                with self._connection:
+                    self._connection.executemany(
+                        'INSERT OR REPLACE INTO segments '
+                        '(segment_hash, source_lang, target_lang, translation, created_at) VALUES (?, ?, ?, ?, ?)',
+                        rows
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"Error writing translation memory: {e}")
+    
+    def stats(self) -> dict:
+        """Return hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
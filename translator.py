@@ -4,46 +4,79 @@ Translation services for converting text content between languages
 
 import logging
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from docx import Document
-from googletrans import Translator as GoogleTranslator
-from file_converter import FileConverter
-from utils import cleanup_file, get_file_extension
-from config import SUPPORTED_LANGUAGES
+import metrics
+import tracing
+from docx_writer import DocxWriter, iter_paragraphs
+from file_converter import FileConverter, ExtractedDocument
+from translation_backends import TranslationBackend, create_backend
+from translation_memory import TranslationMemory
+from utils import cleanup_file
+from config import (
+    SUPPORTED_LANGUAGES, TRANSLATION_MEMORY_ENABLED, TRANSLATION_CONCURRENCY,
+    TRANSLATION_MAX_RETRIES, TRANSLATION_RETRY_BACKOFF, DOCX_FAST_WRITER, WORKSPACE_DIR
+)
 
 logger = logging.getLogger(__name__)
 
+# Sentence-ending punctuation searched for when choosing chunk boundaries
+SENTENCE_TERMINATORS = ('. ', '! ', '? ', '。', '！', '？')
+
+# Segments packed into one request are separated by line breaks, which the service preserves
+BATCH_SEPARATOR = '\n'
+
 class Translator:
-    def __init__(self):
-        self.google_translator = GoogleTranslator()
-        self.file_converter = FileConverter()
+    def __init__(self, file_converter: FileConverter = None, backend: TranslationBackend = None):
+        self.backend = backend or create_backend()
+        self.file_converter = file_converter or FileConverter()
         self.max_chunk_size = 5000  # Google Translate has character limits
+        self.translation_memory = TranslationMemory() if TRANSLATION_MEMORY_ENABLED else None
+        self.translation_concurrency = TRANSLATION_CONCURRENCY
+        self.max_retries = TRANSLATION_MAX_RETRIES
+        self.retry_backoff = TRANSLATION_RETRY_BACKOFF
+        # Segments translated, memory hits, upstream batches and batches split after a line mismatch
+        self.counters = {'segments': 0, 'memory_hits': 0, 'batches': 0, 'batch_splits': 0}
+        self._counters_lock = threading.Lock()
     
-    def translate_file(self, file_path: str, target_lang: str, original_filename: str) -> str:
-        """Translate file content to target language and return as DOCX"""
+    def translate_file(self, file_path, target_lang: str, original_filename: str, file_unique_id: str = None,
+                       extracted: ExtractedDocument = None, output=None):
+        """Translate file content to target language and return as DOCX.
+        
+        file_path may also be the upload's bytes. The DOCX is written to output (a path or
+        binary stream) when given, otherwise to a temporary file whose path is returned.
+        """
         try:
-            # First extract text from the file
-            text_content = self._extract_text_from_file(file_path, original_filename)
+            # First extract text from the file, unless it was already extracted for this upload
+            if extracted is None:
+                extracted = self.file_converter.extract(file_path, original_filename, file_unique_id)
+            text_content = extracted.text
             
             if not text_content.strip():
                 raise ValueError("No text content found in file")
             
-            # Detect source language
-            detection = self.google_translator.detect(text_content[:1000])  # Use first 1000 chars for detection
-            source_lang = detection.lang
-            confidence = detection.confidence
-            
-            logger.info(f"Detected source language: {source_lang} (confidence: {confidence})")
-            
-            # Translate text
-            translated_text = self._translate_text(text_content, source_lang, target_lang)
+            with metrics.timed('translate'):
+                # Detect source language
+                with tracing.span('detect_language') as detect_span:
+                    source_lang, confidence = self.backend.detect(text_content[:1000])  # Use first 1000 chars for detection
+                    detect_span.set(source_lang=source_lang, confidence=confidence)
+                
+                logger.info(f"Detected source language: {source_lang} (confidence: {confidence})")
+                
+                # Translate text
+                translated_text = self._translate_text(text_content, source_lang, target_lang)
             
             # Create DOCX with translated content
-            output_path = self._create_translated_docx(
-                translated_text, 
-                original_filename, 
-                source_lang, 
-                target_lang
-            )
+            with metrics.timed('docx'):
+                output_path = self._create_translated_docx(
+                    translated_text, 
+                    original_filename, 
+                    source_lang, 
+                    target_lang,
+                    output
+                )
             
             return output_path
             
@@ -51,87 +84,217 @@ class Translator:
             logger.error(f"Error translating file {original_filename}: {e}")
             raise
     
-    def _extract_text_from_file(self, file_path: str, original_filename: str) -> str:
-        """Extract text from file using FileConverter"""
-        file_extension = get_file_extension(original_filename).lower()
-        
-        if file_extension == '.txt':
-            return self.file_converter._extract_from_txt(file_path)
-        elif file_extension == '.pdf':
-            return self.file_converter._extract_from_pdf(file_path)
-        elif file_extension in ['.doc', '.docx']:
-            return self.file_converter._extract_from_word(file_path)
-        elif file_extension == '.rtf':
-            return self.file_converter._extract_from_rtf(file_path)
-        elif file_extension == '.odt':
-            return self.file_converter._extract_from_odt(file_path)
-        elif file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']:
-            return self.file_converter._extract_from_image(file_path)
-        else:
-            raise ValueError(f"Unsupported file format for translation: {file_extension}")
-    
     def _translate_text(self, text: str, source_lang: str, target_lang: str) -> str:
         """Translate text content, handling large texts by chunking"""
         try:
-            if len(text) <= self.max_chunk_size:
-                # Text is small enough to translate in one go
-                result = self.google_translator.translate(
-                    text, 
-                    src=source_lang, 
-                    dest=target_lang
-                )
-                return result.text
+            # Split text into line segments; the whitespace between spans is kept to restore the layout
+            spans = self._segment_spans(text)
+            chunks = [text[start:end] for start, end in spans]
+            
+            # Serve repeated segments from the translation memory; only misses go upstream
+            if self.translation_memory:
+                translated_chunks = self.translation_memory.lookup(chunks, source_lang, target_lang)
             else:
-                # Split text into chunks
-                chunks = self._split_text_into_chunks(text)
-                translated_chunks = []
-                
-                for chunk in chunks:
-                    if chunk.strip():
-                        result = self.google_translator.translate(
-                            chunk, 
-                            src=source_lang, 
-                            dest=target_lang
-                        )
-                        translated_chunks.append(result.text)
-                
-                return '\n'.join(translated_chunks)
+                translated_chunks = [None] * len(chunks)
+            
+            missing = [index for index, translation in enumerate(translated_chunks) if translation is None]
+            self._count('segments', len(chunks))
+            self._count('memory_hits', len(chunks) - len(missing))
+            results = self._translate_segments([chunks[index] for index in missing], source_lang, target_lang)
+            new_pairs = []
+            for index, translation in zip(missing, results):
+                translated_chunks[index] = translation
+                new_pairs.append((chunks[index], translation))
+            
+            if self.translation_memory and new_pairs:
+                self.translation_memory.store(new_pairs, source_lang, target_lang)
+            
+            return self._reassemble(text, spans, translated_chunks)
                 
         except Exception as e:
             logger.error(f"Error translating text: {e}")
             raise ValueError("Translation failed. Please try again.")
     
-    def _split_text_into_chunks(self, text: str) -> list:
-        """Split text into chunks that respect sentence boundaries"""
-        chunks = []
-        current_chunk = ""
+    def _translate_segments(self, segments: list, source_lang: str, target_lang: str) -> list:
+        """Translate segments in packed batches, with a bounded number of requests in flight"""
+        batches = self._build_batches(segments)
+        self._count('batches', len(batches))
+        # Bound to the current span so chunks translated on pool threads stay in this job's trace
+        translate_batch = tracing.wrap(lambda batch: self._translate_batch(batch, source_lang, target_lang))
         
-        # Split by sentences (simple approach)
-        sentences = text.replace('.', '.\n').replace('!', '!\n').replace('?', '?\n').split('\n')
+        if self.translation_concurrency <= 1 or len(batches) <= 1:
+            batch_results = [translate_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.translation_concurrency, len(batches))) as executor:
+                batch_results = list(executor.map(translate_batch, batches))
         
-        for sentence in sentences:
-            if len(current_chunk + sentence) <= self.max_chunk_size:
-                current_chunk += sentence + " "
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence + " "
+        return [translation for batch_result in batch_results for translation in batch_result]
+    
+    def _build_batches(self, segments: list) -> list:
+        """Pack consecutive segments into batches that fit in a single request"""
+        batches = []
+        current_batch = []
+        current_size = 0
+        for segment in segments:
+            added_size = len(segment) + (len(BATCH_SEPARATOR) if current_batch else 0)
+            if current_batch and current_size + added_size > self.max_chunk_size:
+                batches.append(current_batch)
+                current_batch = []
+                added_size = len(segment)
+                current_size = 0
+            current_batch.append(segment)
+            current_size += added_size
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+    
+    def _translate_batch(self, batch: list, source_lang: str, target_lang: str) -> list:
+        """Translate a batch in one request and map the result back onto its segments"""
+        if len(batch) == 1:
+            return [self._translate_chunk(batch[0], source_lang, target_lang)]
+        
+        translated = self._translate_chunk(BATCH_SEPARATOR.join(batch), source_lang, target_lang)
+        parts = translated.split(BATCH_SEPARATOR)
+        if len(parts) == len(batch):
+            return [part.strip() for part in parts]
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        # The service merged or split lines, so segments can't be matched up; retry in halves
+        logger.warning(f"Batch of {len(batch)} segments came back as {len(parts)} lines, splitting batch")
+        self._count('batch_splits')
+        self._count('batches', 2)
+        middle = len(batch) // 2
+        return (self._translate_batch(batch[:middle], source_lang, target_lang)
+                + self._translate_batch(batch[middle:], source_lang, target_lang))
+    
+    def _translate_chunk(self, chunk: str, source_lang: str, target_lang: str) -> str:
+        """Translate a single chunk, retrying just this chunk with exponential backoff"""
+        with tracing.span('translate_chunk', characters=len(chunk)) as chunk_span:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    chunk_span.set(attempts=attempt + 1)
+                    return self.backend.translate(chunk, source_lang, target_lang)
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_backoff * (2 ** attempt)
+                    logger.warning(f"Chunk translation failed (attempt {attempt + 1}): {e}. Retrying in {delay:.1f}s")
+                    time.sleep(delay)
+    
+    def _count(self, counter: str, amount: int = 1):
+        with self._counters_lock:
+            self.counters[counter] += amount
+    
+    def _segment_spans(self, text: str) -> list:
+        """Return one span per non-empty line, chunking any line longer than max_chunk_size"""
+        spans = []
+        position = 0
+        text_length = len(text)
+        while position < text_length:
+            line_end = text.find('\n', position)
+            if line_end == -1:
+                line_end = text_length
+            spans.extend(self._chunk_spans(text, position, line_end))
+            position = line_end + 1
+        return spans
+    
+    def _chunk_spans(self, text: str, start: int = 0, end: int = None) -> list:
+        """Return (start, end) index ranges of text[start:end], each at most max_chunk_size characters.
+        
+        Makes a single left-to-right pass. Surrounding whitespace is left outside the
+        spans so it can be copied verbatim between the translated chunks.
+        """
+        spans = []
+        text_length = len(text) if end is None else end
+        position = self._skip_whitespace(text, start, text_length)
+        
+        while position < text_length:
+            limit = position + self.max_chunk_size
+            cut = text_length if limit >= text_length else self._find_cut(text, position, limit)
+            
+            chunk_end = cut
+            while text[chunk_end - 1].isspace():
+                chunk_end -= 1
+            spans.append((position, chunk_end))
+            position = self._skip_whitespace(text, cut, text_length)
+        
+        return spans
+    
+    def _find_cut(self, text: str, position: int, limit: int) -> int:
+        """Pick where a chunk of an over-long line should end, searching no further back than needed.
+        
+        Segments are single lines (see _segment_spans), so only sentence and word
+        boundaries can occur inside the window.
+        """
+        # Only accept boundaries in the second half of the window so chunks stay reasonably full
+        minimum = position + self.max_chunk_size // 2
+        
+        # Sentence end (keep the punctuation with the sentence)
+        cut = max(text.rfind(terminator, minimum, limit) for terminator in SENTENCE_TERMINATORS)
+        if cut != -1:
+            return cut + 1
+        
+        # Any word boundary, preferring one in the second half
+        cut = max(text.rfind(' ', minimum, limit), text.rfind('\t', minimum, limit))
+        if cut != -1:
+            return cut
+        cut = max(text.rfind(' ', position + 1, minimum), text.rfind('\t', position + 1, minimum))
+        if cut != -1:
+            return cut
         
-        return chunks
+        # A single word longer than half a chunk: hard cut
+        return limit
     
-    def _create_translated_docx(self, translated_text: str, original_filename: str, source_lang: str, target_lang: str) -> str:
+    @staticmethod
+    def _skip_whitespace(text: str, position: int, end: int) -> int:
+        while position < end and text[position].isspace():
+            position += 1
+        return position
+    
+    @staticmethod
+    def _reassemble(text: str, spans: list, translated_chunks: list) -> str:
+        """Put translated chunks back in place of their spans, keeping the original whitespace between them"""
+        parts = []
+        previous_end = 0
+        for (start, end), translated_chunk in zip(spans, translated_chunks):
+            parts.append(text[previous_end:start])
+            parts.append(translated_chunk)
+            previous_end = end
+        parts.append(text[previous_end:])
+        return ''.join(parts)
+    
+    @tracing.traced('docx')
+    def _create_translated_docx(self, translated_text: str, original_filename: str, source_lang: str, target_lang: str,
+                                output=None):
         """Create a DOCX file with translated content"""
         try:
+            source_lang_name = SUPPORTED_LANGUAGES.get(source_lang, source_lang.upper())
+            target_lang_name = SUPPORTED_LANGUAGES.get(target_lang, target_lang.upper())
+            
+            if DOCX_FAST_WRITER:
+                def write(target):
+                    with DocxWriter(target) as writer:
+                        writer.add_paragraph(f'Translated: {original_filename}', style='Title')
+                        writer.add_paragraph(f'From {source_lang_name} to {target_lang_name}', style='Subtitle')
+                        writer.add_paragraph('─' * 50)
+                        writer.add_paragraphs(iter_paragraphs(translated_text))
+                
+                if output is not None:
+                    write(output)
+                    return output
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.docx', dir=WORKSPACE_DIR) as temp_file:
+                    try:
+                        write(temp_file)
+                    except BaseException:
+                        # Don't leave a half-written document behind in the workspace directory
+                        temp_file.close()
+                        cleanup_file(temp_file.name)
+                        raise
+                    return temp_file.name
+            
             # Create new document
             doc = Document()
             
             # Add title with translation info
-            source_lang_name = SUPPORTED_LANGUAGES.get(source_lang, source_lang.upper())
-            target_lang_name = SUPPORTED_LANGUAGES.get(target_lang, target_lang.upper())
-            
             title = doc.add_heading(f'Translated: {original_filename}', 0)
             subtitle = doc.add_paragraph(f'From {source_lang_name} to {target_lang_name}')
             subtitle.style = 'Subtitle'
@@ -140,14 +303,21 @@ class Translator:
             doc.add_paragraph('─' * 50)
             
             # Add translated content
-            paragraphs = translated_text.split('\n')
-            for paragraph_text in paragraphs:
-                if paragraph_text.strip():
-                    doc.add_paragraph(paragraph_text.strip())
+            for paragraph_text in iter_paragraphs(translated_text):
+                doc.add_paragraph(paragraph_text)
+            
+            if output is not None:
+                doc.save(output)
+                return output
             
             # Save to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-                doc.save(temp_file.name)
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx', dir=WORKSPACE_DIR) as temp_file:
+                try:
+                    doc.save(temp_file)
+                except BaseException:
+                    temp_file.close()
+                    cleanup_file(temp_file.name)
+                    raise
                 return temp_file.name
                 
         except Exception as e:
@@ -0,0 +1,51 @@
+"""
+Drop Telegram updates that were already handled by any bot process on this host
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from config import UPDATE_DEDUP_PATH
+
+logger = logging.getLogger(__name__)
+
+# Telegram stops redelivering an update long before this
+UPDATE_RETENTION_SECONDS = 24 * 60 * 60
+PRUNE_INTERVAL_SECONDS = 10 * 60
+
+class UpdateDeduplicator:
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or UPDATE_DEDUP_PATH
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS processed_updates ('
+            ' update_id INTEGER PRIMARY KEY,'
+            ' received_at REAL NOT NULL)'
+        )
+        self._connection.commit()
+    
+    def is_duplicate(self, update_id: int) -> bool:
+        """Record an update and return True if some process already recorded it"""
+        now = time.time()
+        try:
+            with self._lock:
+                with self._connection:
+                    cursor = self._connection.execute(
+                        'INSERT OR IGNORE INTO processed_updates (update_id, received_at) VALUES (?, ?)',
+                        (update_id, now)
+                    )
+                    if now - self._last_prune > PRUNE_INTERVAL_SECONDS:
+                        self._connection.execute(
+                            'DELETE FROM processed_updates WHERE received_at < ?',
+                            (now - UPDATE_RETENTION_SECONDS,)
+                        )
+                        self._last_prune = now
+                return cursor.rowcount == 0
+        except sqlite3.Error as e:
+            # Better to risk handling an update twice than to drop it
+            logger.error(f"Error checking update {update_id} for duplicates: {e}")
+            return False
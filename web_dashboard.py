@@ -5,18 +5,21 @@ Updated for python-telegram-bot v22.1+ async compatibility
 
 import os
 import json
+import hashlib
 import logging
 import asyncio
 import signal
 import threading
 import time
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, session, flash, jsonify, send_file
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired
-import subprocess
-import psutil
+from config import STATUS_REFRESH_INTERVAL, BOT_HEARTBEAT_TIMEOUT
+from metrics import read_snapshot, summarize, render_prometheus
+from storage import Store
+from supervisor import BotSupervisor
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-change-this-in-production')
@@ -33,17 +36,19 @@ if os.getenv('FLASK_DEBUG', 'False').lower() == 'true':
 WEB_PASSWORD = os.getenv('WEB_PASSWORD', 'admin123')
 AUTHORIZED_USERS_FILE = 'authorized_users.json'
 
+# Shared with the bot process; replaces direct edits of authorized_users.json
+store = Store()
+store.import_authorized_users_file(AUTHORIZED_USERS_FILE)
+
+# Runs app.py (the bot) as a child process and restarts it if it crashes
+bot_env = os.environ.copy()
+bot_env['TELEGRAM_BOT_TOKEN'] = '7902520183:AAEUOwfPokeOEhlF9QVGYcMMFuxFcSme7p0'
+supervisor = BotSupervisor(env=bot_env)
+
 # Global variables
-bot_process = None
 bot_running = False
-
-# Initialize bot status on startup
-def initialize_bot_status():
-    """Initialize bot running status on startup"""
-    global bot_running, bot_process
-    bot_running = is_bot_running()
-    if not bot_running:
-        bot_process = None
+# Published by the status refresher; status endpoints only ever read it
+status_snapshot = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -58,110 +63,83 @@ class UserForm(FlaskForm):
     submit = SubmitField('Add User')
 
 def load_authorized_users():
-    """Load authorized users from JSON file"""
+    """Load authorized users from the shared store"""
     try:
-        if os.path.exists(AUTHORIZED_USERS_FILE):
-            with open(AUTHORIZED_USERS_FILE, 'r') as f:
-                return json.load(f)
-        return []
+        return store.list_authorized_users()
     except Exception as e:
         logger.error(f"Error loading authorized users: {e}")
         return []
 
-def save_authorized_users(users):
-    """Save authorized users to JSON file"""
+def add_authorized_user(user_id):
+    """Add a user in one transaction; returns True, False if already present, or None on error"""
     try:
-        with open(AUTHORIZED_USERS_FILE, 'w') as f:
-            json.dump(users, f, indent=2)
-        return True
+        added = store.add_authorized_user(user_id)
+        if added:
+            notify_bot_users_changed()
+        return added
     except Exception as e:
-        logger.error(f"Error saving authorized users: {e}")
-        return False
+        logger.error(f"Error adding authorized user {user_id}: {e}")
+        return None
+
+def remove_authorized_user(user_id):
+    """Remove a user in one transaction; returns True, False if not present, or None on error"""
+    try:
+        removed = store.remove_authorized_user(user_id)
+        if removed:
+            notify_bot_users_changed()
+        return removed
+    except Exception as e:
+        logger.error(f"Error removing authorized user {user_id}: {e}")
+        return None
+
+def flash_add_user_result(user_id):
+    """Add a user and flash the outcome"""
+    added = add_authorized_user(user_id)
+    if added:
+        flash(f'User {user_id} added successfully!', 'success')
+    elif added is None:
+        flash('Failed to save user!', 'error')
+    else:
+        flash('User already exists!', 'warning')
+
+def load_profiling_state():
+    """Return (jobs still to be profiled, recent profiles) from the shared store"""
+    try:
+        job_profiles = store.recent_job_profiles()
+        for profile in job_profiles:
+            if profile['started_at'] and profile['finished_at']:
+                profile['duration'] = round(profile['finished_at'] - profile['started_at'], 2)
+            profile['created'] = datetime.fromtimestamp(profile['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+        return store.profiling_remaining(), job_profiles
+    except Exception as e:
+        logger.error(f"Error loading profiling state: {e}")
+        return 0, []
+
+def notify_bot_users_changed():
+    """Tell a running bot to reload its authorized-user index now"""
+    # A bot that is still starting is not signalled; it reads the current list once it is up
+    try:
+        supervisor.send_signal(signal.SIGHUP)
+    except Exception as e:
+        logger.error(f"Error signalling bot: {e}")
 
 def is_bot_running():
     """Check if bot is currently running"""
-    global bot_process, bot_running
+    global bot_running
     try:
-        # First check if we have a tracked process that's still running
-        if bot_process and bot_process.poll() is None:
-            bot_running = True
-            return True
-        
-        # Check system processes for any running bot (app.py)
-        import psutil
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if 'python' in proc.info['name'] and proc.info['cmdline']:
-                    cmdline = ' '.join(proc.info['cmdline'])
-                    # Look for app.py (bot entry point) but exclude this web dashboard
-                    if 'app.py' in cmdline and 'main.py' not in cmdline:
-                        bot_running = True
-                        return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        
-        # No bot process found
-        bot_running = False
-        bot_process = None
-        return False
+        bot_running = supervisor.is_running()
     except Exception as e:
         logger.error(f"Error checking bot status: {e}")
         bot_running = False
-        return False
+    return bot_running
 
 def start_bot():
-    """Start the Telegram bot"""
-    global bot_process, bot_running
+    """Start the Telegram bot, replacing any running instance"""
+    global bot_running
     try:
-        # First stop any existing bot instances
-        stop_bot()
-        
-        # Kill any existing python main.py processes
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if 'python' in proc.info['name'] and proc.info['cmdline']:
-                    cmdline = ' '.join(proc.info['cmdline'])
-                    if 'main.py' in cmdline:
-                        proc.terminate()
-                        try:
-                            proc.wait(timeout=5)
-                        except psutil.TimeoutExpired:
-                            proc.kill()
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        
-        # Wait a moment to ensure processes are terminated
-        time.sleep(2)
-        
-        # Start new bot process with environment variables
-        env = os.environ.copy()
-        env['TELEGRAM_BOT_TOKEN'] = '7902520183:AAEUOwfPokeOEhlF9QVGYcMMFuxFcSme7p0'
-        bot_process = subprocess.Popen(['python', 'app.py'], 
-                                     env=env,
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE,
-                                     cwd=os.getcwd())
-        
-        # Wait a moment to check if bot started successfully
-        time.sleep(3)
-        
-        # Check if process is still running
-        if bot_process.poll() is None:
-            bot_running = True
-            logger.info("Bot started successfully")
-            return True
-        else:
-            # Bot process died, get error output
-            stdout, stderr = bot_process.communicate()
-            error_msg = stderr.decode() if stderr else stdout.decode()
-            
-            # Check for port conflict
-            if "Address already in use" in error_msg:
-                logger.error("Bot failed to start: Address already in use\nPort 5000 is in use by another program. Either identify and stop that program, or start the server with a different port.")
-            else:
-                logger.error(f"Bot failed to start: {error_msg}")
-            bot_running = False
-            return False
+        bot_running = supervisor.start()
+        refresh_status_snapshot()
+        return bot_running
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
         bot_running = False
@@ -169,43 +147,59 @@ def start_bot():
 
 def stop_bot():
     """Stop the Telegram bot"""
-    global bot_process, bot_running
+    global bot_running
     try:
-        # Stop the tracked process
-        if bot_process and bot_process.poll() is None:
-            bot_process.terminate()
-            try:
-                bot_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                bot_process.kill()
-                bot_process.wait()
-        
-        # Also kill any python main.py processes
-        killed_any = False
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                if 'python' in proc.info['name'] and proc.info['cmdline']:
-                    cmdline = ' '.join(proc.info['cmdline'])
-                    if 'main.py' in cmdline:
-                        proc.terminate()
-                        try:
-                            proc.wait(timeout=5)
-                        except psutil.TimeoutExpired:
-                            proc.kill()
-                        killed_any = True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        
+        supervisor.stop()
         bot_running = False
-        if killed_any:
-            logger.info("Bot stopped successfully")
-        else:
-            logger.info("Bot was not running")
+        refresh_status_snapshot()
         return True
     except Exception as e:
         logger.error(f"Error stopping bot: {e}")
         return False
 
+def refresh_status_snapshot():
+    """Rebuild the status snapshot and publish it with a single reference swap"""
+    global status_snapshot
+    bot_status = supervisor.status()
+    try:
+        user_count = store.count_authorized_users()
+    except Exception as e:
+        logger.error(f"Error counting authorized users: {e}")
+        user_count = status_snapshot['user_count'] if status_snapshot else None
+    status_snapshot = {
+        'bot_running': bot_status['running'],
+        'bot_state': bot_status['state'],
+        'status_text': 'Running' if bot_status['running'] else bot_status['state'].capitalize(),
+        'user_count': user_count,
+        # Last stats file written by the bot (see metrics.py), or None before its first heartbeat
+        'metrics': read_snapshot(),
+        'refreshed_at': time.time()
+    }
+
+def status_refresh_loop():
+    while True:
+        time.sleep(STATUS_REFRESH_INTERVAL)
+        try:
+            refresh_status_snapshot()
+        except Exception as e:
+            logger.error(f"Error refreshing status snapshot: {e}")
+
+def snapshot_response(fields: dict):
+    """JSON response built from the status snapshot, with its age and an ETag for conditional polling"""
+    refreshed_at = status_snapshot['refreshed_at']
+    response = jsonify({
+        **fields,
+        'timestamp': datetime.fromtimestamp(refreshed_at).isoformat(),
+        'age': round(time.time() - refreshed_at, 1)
+    })
+    # Weak because timestamp and age change without the status itself changing
+    response.set_etag(hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest(), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+refresh_status_snapshot()
+threading.Thread(target=status_refresh_loop, name='status-refresher', daemon=True).start()
+
 def requires_auth(f):
     """Decorator for routes that require authentication"""
     def decorated_function(*args, **kwargs):
@@ -221,17 +215,19 @@ def index():
     if not session.get('authenticated'):
         return redirect(url_for('login'))
     
-    # Initialize and check bot status
-    initialize_bot_status()
+    # Check bot status
     bot_status = is_bot_running()
     authorized_users = load_authorized_users()
     user_form = UserForm()
+    profiling_remaining, job_profiles = load_profiling_state()
     
     return render_template('dashboard.html', 
                          bot_running=bot_status,
                          authorized_users=authorized_users,
                          user_count=len(authorized_users),
-                         user_form=user_form)
+                         user_form=user_form,
+                         profiling_remaining=profiling_remaining,
+                         job_profiles=job_profiles)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -285,30 +281,14 @@ def add_user():
         if form.validate_on_submit():
             user_id = form.user_id.data.strip()
             if user_id.isdigit():
-                users = load_authorized_users()
-                if user_id not in users:
-                    users.append(user_id)
-                    if save_authorized_users(users):
-                        flash(f'User {user_id} added successfully!', 'success')
-                    else:
-                        flash('Failed to save user!', 'error')
-                else:
-                    flash('User already exists!', 'warning')
+                flash_add_user_result(user_id)
             else:
                 flash('User ID must be numeric!', 'error')
         else:
             # Try to get user_id from raw form data if WTF validation fails
             user_id = request.form.get('user_id', '').strip()
             if user_id and user_id.isdigit():
-                users = load_authorized_users()
-                if user_id not in users:
-                    users.append(user_id)
-                    if save_authorized_users(users):
-                        flash(f'User {user_id} added successfully!', 'success')
-                    else:
-                        flash('Failed to save user!', 'error')
-                else:
-                    flash('User already exists!', 'warning')
+                flash_add_user_result(user_id)
             else:
                 flash('Please enter a valid numeric User ID!', 'error')
     except Exception as e:
@@ -322,13 +302,11 @@ def add_user():
 def remove_user(user_id):
     """Remove authorized user"""
     try:
-        users = load_authorized_users()
-        if user_id in users:
-            users.remove(user_id)
-            if save_authorized_users(users):
-                flash(f'User {user_id} removed successfully!', 'success')
-            else:
-                flash('Failed to remove user!', 'error')
+        removed = remove_authorized_user(user_id)
+        if removed:
+            flash(f'User {user_id} removed successfully!', 'success')
+        elif removed is None:
+            flash('Failed to remove user!', 'error')
         else:
             flash('User not found!', 'warning')
     except Exception as e:
@@ -337,34 +315,82 @@ def remove_user(user_id):
     
     return redirect(url_for('index'))
 
+@app.route('/profiling', methods=['POST'])
+@requires_auth
+def request_profiling():
+    """Run the next N jobs under the profiler (0 cancels a pending request)"""
+    count = request.form.get('count', '').strip()
+    if not count.isdigit() or int(count) > 100:
+        flash('Enter a number of jobs between 0 and 100!', 'error')
+        return redirect(url_for('index'))
+    try:
+        store.request_profiling(int(count))
+        flash(f'The next {count} jobs will be profiled' if int(count) else 'Profiling request cancelled', 'success')
+    except Exception as e:
+        logger.error(f"Error requesting profiling: {e}")
+        flash('Failed to request profiling!', 'error')
+    return redirect(url_for('index'))
+
+@app.route('/profiles/<job_id>/<artifact>')
+@requires_auth
+def download_profile(job_id, artifact):
+    """Download a job's raw cProfile stats ('prof', for pstats or snakeviz) or text summary ('txt')"""
+    profile = store.job_profile(job_id)
+    if profile is None or artifact not in ('prof', 'txt'):
+        abort(404)
+    path = profile['path'] if artifact == 'prof' else profile['summary_path']
+    if not path or not os.path.exists(path):
+        abort(404)
+    if artifact == 'txt':
+        return send_file(path, mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=f'{job_id}.prof')
+
 @app.route('/api/status')
 @requires_auth
 def api_status():
     """API endpoint for bot status"""
-    return jsonify({
-        'bot_running': is_bot_running(),
-        'user_count': len(load_authorized_users()),
-        'timestamp': datetime.now().isoformat()
+    return snapshot_response({
+        'bot_running': status_snapshot['bot_running'],
+        'bot_state': status_snapshot['bot_state'],
+        'user_count': status_snapshot['user_count']
     })
 
+@app.route('/api/metrics')
+@requires_auth
+def api_metrics():
+    """Job metrics summarized for the dashboard's live panel"""
+    bot_metrics = status_snapshot['metrics']
+    if bot_metrics is None:
+        return snapshot_response({'available': False})
+    return snapshot_response({
+        'available': True,
+        # Metrics stop updating when the bot does; flag them rather than showing old numbers as live
+        'stale': time.time() - bot_metrics['updated_at'] > BOT_HEARTBEAT_TIMEOUT,
+        **summarize(bot_metrics)
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Job metrics in the Prometheus text format (no auth required, like /health)"""
+    bot_metrics = status_snapshot['metrics']
+    if bot_metrics is None:
+        return Response('', mimetype='text/plain; version=0.0.4')
+    return Response(render_prometheus(bot_metrics), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health')
 def health():
     """Health check endpoint for Render"""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
-    })
+    # A snapshot this old means the refresher thread has died
+    stale = time.time() - status_snapshot['refreshed_at'] > 5 * STATUS_REFRESH_INTERVAL + 10
+    return snapshot_response({'status': 'degraded' if stale else 'healthy'})
 
 @app.route('/api/public-status')
 def public_status():
     """Public API endpoint for bot status (no auth required)"""
     try:
-        status = is_bot_running()
-        logger.info(f"Bot status check: {status}")
-        return jsonify({
-            'bot_running': status,
-            'timestamp': datetime.now().isoformat(),
-            'status_text': 'Running' if status else 'Stopped'
+        return snapshot_response({
+            'bot_running': status_snapshot['bot_running'],
+            'status_text': status_snapshot['status_text']
         })
     except Exception as e:
         logger.error(f"Error checking bot status: {e}")
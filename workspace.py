@@ -0,0 +1,194 @@
+"""
+Per-job scratch directories under TEMP_DIR with TTL sweeping and a disk quota
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from config import WORKSPACE_DIR, WORKSPACE_TTL, WORKSPACE_MAX_BYTES, WORKSPACE_SWEEP_INTERVAL, WORKSPACE_WAIT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class WorkspaceQuotaExceeded(ValueError):
+    """Raised when a new workspace would not fit in the disk quota before the wait timeout"""
+
+def _path_size(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for directory, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total += os.path.getsize(os.path.join(directory, file_name))
+            except OSError:
+                pass
+    return total
+
+class Workspace:
+    """A directory owned by one job; everything in it is removed when the job releases it"""
+    
+    def __init__(self, manager, workspace_id: str, path: str, reserved_bytes: int):
+        self.manager = manager
+        self.workspace_id = workspace_id
+        self.path = path
+        self.reserved_bytes = reserved_bytes
+        self.created_at = time.time()
+    
+    def file_path(self, name: str) -> str:
+        """Return a path for a file inside the workspace"""
+        return os.path.join(self.path, os.path.basename(name))
+    
+    def release(self):
+        self.manager.release(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        self.release()
+        return False
+
+class WorkspaceManager:
+    def __init__(self, root: str = None, ttl: float = None, max_bytes: int = None,
+                 sweep_interval: float = None, wait_timeout: float = None):
+        self.root = root or WORKSPACE_DIR
+        self.ttl = WORKSPACE_TTL if ttl is None else ttl
+        self.max_bytes = WORKSPACE_MAX_BYTES if max_bytes is None else max_bytes
+        self.sweep_interval = WORKSPACE_SWEEP_INTERVAL if sweep_interval is None else sweep_interval
+        self.wait_timeout = WORKSPACE_WAIT_TIMEOUT if wait_timeout is None else wait_timeout
+        self._condition = threading.Condition()
+        self._workspaces = {}  # workspace_id -> Workspace
+        self._reserved_bytes = 0
+        self._orphan_bytes = 0  # Left on disk by earlier processes, until the sweeper removes it
+        self._counters = {'created': 0, 'released': 0, 'swept': 0, 'waited': 0, 'rejected': 0}
+        self._wait_seconds = 0.0
+        self._stop = threading.Event()
+        self._sweeper = None
+        os.makedirs(self.root, exist_ok=True)
+        self.sweep()
+    
+    def start(self):
+        """Start the background sweeper thread"""
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='workspace-sweeper', daemon=True)
+            self._sweeper.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def create(self, expected_bytes: int = 0) -> Workspace:
+        """Create a workspace, waiting for space if expected_bytes would exceed the quota.
+        
+        Blocks for up to wait_timeout seconds, so call it off the event loop.
+        """
+        expected_bytes = max(0, expected_bytes or 0)
+        started = time.monotonic()
+        with self._condition:
+            if not self._fits(expected_bytes):
+                self._counters['waited'] += 1
+                self._condition.wait_for(lambda: self._fits(expected_bytes), timeout=self.wait_timeout)
+                self._wait_seconds += time.monotonic() - started
+                if not self._fits(expected_bytes):
+                    self._counters['rejected'] += 1
+                    raise WorkspaceQuotaExceeded("Server is busy, please try again in a few minutes")
+            
+            workspace_id = uuid.uuid4().hex
+            path = os.path.join(self.root, workspace_id)
+            os.makedirs(path)
+            workspace = Workspace(self, workspace_id, path, expected_bytes)
+            self._workspaces[workspace_id] = workspace
+            self._reserved_bytes += expected_bytes
+            self._counters['created'] += 1
+            return workspace
+    
+    def get(self, workspace_id: str):
+        """Return a live workspace by id, adopting one left by an earlier process; None if it is gone"""
+        if not workspace_id:
+            return None
+        with self._condition:
+            workspace = self._workspaces.get(workspace_id)
+            if workspace is not None:
+                return workspace
+            path = os.path.join(self.root, os.path.basename(workspace_id))
+            if not os.path.isdir(path):
+                return None
+            size = _path_size(path)
+            workspace = Workspace(self, workspace_id, path, size)
+            workspace.created_at = os.path.getmtime(path)
+            self._workspaces[workspace_id] = workspace
+            self._reserved_bytes += size
+            self._orphan_bytes = max(0, self._orphan_bytes - size)
+            return workspace
+    
+    def release(self, workspace: Workspace):
+        """Delete a workspace and return its reservation to the quota"""
+        with self._condition:
+            if self._workspaces.pop(workspace.workspace_id, None) is None:
+                return
+            self._reserved_bytes -= workspace.reserved_bytes
+            self._counters['released'] += 1
+            self._condition.notify_all()
+        shutil.rmtree(workspace.path, ignore_errors=True)
+    
+    def sweep(self):
+        """Remove workspaces and stray files older than the TTL"""
+        cutoff = time.time() - self.ttl
+        orphan_bytes = 0
+        for entry in os.scandir(self.root):
+            try:
+                expired = entry.stat().st_mtime < cutoff
+                with self._condition:
+                    workspace = self._workspaces.get(entry.name)
+                if workspace is not None:
+                    if workspace.created_at < cutoff:
+                        logger.warning(f"Workspace {entry.name} outlived its TTL; removing it")
+                        self.release(workspace)
+                        self._count('swept')
+                    continue
+                if expired:
+                    if entry.is_dir():
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+                    self._count('swept')
+                else:
+                    orphan_bytes += _path_size(entry.path)
+            except FileNotFoundError:
+                # Released by its owner while we were looking at it
+                continue
+            except OSError as e:
+                logger.error(f"Error sweeping workspace entry {entry.name}: {e}")
+        
+        with self._condition:
+            self._orphan_bytes = orphan_bytes
+            self._condition.notify_all()
+    
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'active_workspaces': len(self._workspaces),
+                'reserved_bytes': self._reserved_bytes,
+                'orphan_bytes': self._orphan_bytes,
+                'max_bytes': self.max_bytes,
+                'wait_seconds': round(self._wait_seconds, 3),
+                **self._counters
+            }
+    
+    def _fits(self, expected_bytes: int) -> bool:
+        used = self._reserved_bytes + self._orphan_bytes
+        # An empty quota always admits one job so a single oversized upload cannot wedge the queue
+        return used + expected_bytes <= self.max_bytes or not self._workspaces
+    
+    def _count(self, counter: str):
+        with self._condition:
+            self._counters[counter] += 1
+    
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping workspaces: {e}")